@@ -0,0 +1,109 @@
+"""
+Compares rendering large Latin-1 and UTF-8 documents with the display text
+serialized to str (encoding='unicode', as XML.text is now) against the
+earlier paths that serialized it to bytes and left pygments to guess and
+decode their encoding:
+
+- ascii: lxml's default serialization, which writes non-ASCII characters
+  as character references, so they were displayed as e.g. &#233;
+- utf-8: UTF-8 bytes
+
+For each encoding the same generated document, with non-ASCII text in every
+row, is parsed once, and each path's serialization and highlighting is timed
+(best of --repeat runs) and its peak Python memory traced. The time of the
+whole XML(data)._repr_html_() is reported as well.
+
+Run from the repository root:
+
+    python benchmarks/encoding.py [rows] [--repeat N]
+
+Exits 1 if the str path doesn't display the non-ASCII characters as written.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from lxml import etree as et  # noqa: E402
+from pygments import highlight  # noqa: E402
+from pygments.formatters import HtmlFormatter  # noqa: E402
+from pygments.lexers import XmlLexer  # noqa: E402
+
+from display_xml import XML  # noqa: E402
+
+SAMPLE = "café crème brûlée"
+
+PATHS = {
+    "ascii": lambda root: et.tostring(root, pretty_print=True),
+    "utf-8": lambda root: et.tostring(root, pretty_print=True,
+                                      encoding='utf-8'),
+    "str": lambda root: et.tostring(root, pretty_print=True,
+                                    encoding='unicode'),
+}
+
+
+def make_document(rows, encoding):
+    text = (f'<?xml version="1.0" encoding="{encoding}"?>\n<root>'
+            + "".join(f'<row id="{i}"><v>{SAMPLE} {i}</v></row>'
+                      for i in range(rows))
+            + "</root>")
+    return text.encode(encoding)
+
+
+def render(root, path):
+    return highlight(PATHS[path](root), XmlLexer(), HtmlFormatter())
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def traced_peak(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("rows", nargs="?", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failures = []
+    mib = 1024 * 1024
+    print(f"{args.rows:,} rows, best of {args.repeat}")
+    print(f"  {'encoding':<10} {'path':<6} {'render':>8} {'peak traced':>12}"
+          f"  {'shows text':>10}")
+    for encoding in ("ISO-8859-1", "UTF-8"):
+        data = make_document(args.rows, encoding)
+        root = et.fromstring(data, parser=et.XMLParser(remove_blank_text=True))
+        for path in PATHS:
+            seconds, html = best_of(args.repeat, lambda: render(root, path))
+            peak = traced_peak(lambda: render(root, path))
+            shows = all(word in html for word in SAMPLE.split())
+            print(f"  {encoding:<10} {path:<6} {seconds:>7.2f}s"
+                  f" {peak / mib:>8.1f} MiB  {'yes' if shows else 'no':>10}")
+            if path == "str" and not shows:
+                failures.append(encoding)
+        seconds, _ = best_of(args.repeat, lambda: XML(data)._repr_html_())
+        print(f"  {encoding:<10} XML(data)._repr_html_(): {seconds:.2f}s"
+              f" ({len(data) / mib:.1f} MiB input)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
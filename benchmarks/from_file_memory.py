@@ -0,0 +1,77 @@
+"""
+Compares peak memory of XML.from_file against XML(open(path, 'rb').read()).
+
+Each path runs in a fresh interpreter on the same generated file, and
+reports two numbers:
+
+- peak RSS growth while building the display (ru_maxrss after minus before)
+- peak tracemalloc memory, i.e. Python-level allocations such as the bytes
+  object read from the file (lxml's own allocations are not traced)
+
+Run from the repository root:
+
+    python benchmarks/from_file_memory.py [rows]
+
+Exits 1 if from_file's peak RSS growth is not below the read() path's.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import resource, sys, tracemalloc
+sys.path.insert(0, {root!r})
+from display_xml import XML
+path, mode = sys.argv[1:]
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+if mode == 'from_file':
+    disp = XML.from_file(path)
+else:
+    with open(path, 'rb') as f:
+        disp = XML(f.read())
+_, traced = tracemalloc.get_traced_memory()
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in KiB on Linux and bytes on macOS
+scale = 1 if sys.platform == 'darwin' else 1024
+print((after - before) * scale, traced)
+"""
+
+
+def measure(path, mode):
+    code = CHILD.format(root=os.path.join(HERE, os.pardir))
+    out = subprocess.run([sys.executable, "-c", code, path, mode],
+                         check=True, stdout=subprocess.PIPE, 
+                         universal_newlines=True).stdout
+    rss, traced = map(int, out.split())
+    return rss, traced
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rows = int(argv[0]) if argv else 500000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doc.xml")
+        with open(path, "w") as f:
+            f.write("<root>")
+            for i in range(rows):
+                f.write(f'<row id="{i}"><v>value {i}</v></row>')
+            f.write("</root>")
+        size = os.path.getsize(path)
+        results = {mode: measure(path, mode) for mode in ("read", "from_file")}
+
+    mib = 1024 * 1024
+    print(f"file: {size / mib:.1f} MiB ({rows:,} rows)")
+    print(f"  {'path':<10} {'peak RSS growth':>16} {'peak traced':>12}")
+    for mode, (rss, traced) in results.items():
+        print(f"  {mode:<10} {rss / mib:>12.1f} MiB {traced / mib:>8.1f} MiB")
+    saved = results["read"][0] - results["from_file"][0]
+    print(f"from_file saves {saved / mib:.1f} MiB of peak RSS")
+    return 0 if saved > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Memory and output-size regression checks for display_xml.
+
+Builds XML(...) and renders _repr_html_ for generated documents under 
+tracemalloc, and compares against the budgets in memory_budgets.json:
+
+- peak traced memory per input byte, for each generated document
+- html output bytes per input byte, for each generated document in each
+  style from XML.style_gen, keyed "document/style"
+
+Run from the repository root:
+
+    python benchmarks/memory_budgets.py            # check, exit 1 on failure
+    python benchmarks/memory_budgets.py --update   # rewrite the budgets
+
+--update records the current measurements plus HEADROOM; only use it when
+an increase is intended, and commit the budget file with the change.
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from display_xml import XML  # noqa: E402
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "memory_budgets.json")
+
+#: Fraction added on top of measurements when budgets are updated.
+HEADROOM = 0.25
+
+
+def generate_documents():
+    """
+    Returns {name: bytes} of documents exercising different shapes.
+    """
+    rows = "".join(f'<row id="{i}"><v>value {i}</v><w>{i * 7}</w></row>'
+                   for i in range(2000))
+    nested = "<n>" * 200 + "leaf" + "</n>" * 200
+    blob = "QUJD" * 50000
+    text = f'<env><sig alg="rsa">{blob}</sig><body>small</body></env>'
+    mixed = "".join(f'<p>Some <b>bold</b> and <i a="{i}">é</i> text</p>'
+                    for i in range(1000))
+    return {"rows": f"<root>{rows}</root>".encode(),
+            "nested": nested.encode(),
+            "large_text": text.encode(),
+            "mixed": f"<doc>{mixed}</doc>".encode("utf-8")}
+
+
+def measure_peak(doc):
+    """
+    Peak traced memory of constructing and rendering doc, per input byte.
+    """
+    tracemalloc.start()
+    try:
+        XML(doc)._repr_html_()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / len(doc)
+
+
+def measure():
+    docs = generate_documents()
+    results = {"peak_memory_per_input_byte": {}, 
+               "html_bytes_per_input_byte": {}}
+    for name, doc in docs.items():
+        results["peak_memory_per_input_byte"][name] = measure_peak(doc)
+    for name, doc in docs.items():
+        # per document as well as style: a budget taken as the max over 
+        # documents would let the smaller ratios grow unnoticed
+        by_doc_style = results["html_bytes_per_input_byte"]
+        for disp in XML.style_gen(doc):
+            ratio = len(disp._repr_html_().encode("utf-8")) / len(doc)
+            by_doc_style[f"{name}/{disp.style}"] = ratio
+    return results
+
+
+def check(results, budgets):
+    """
+    Returns (failures, missing): lists of (metric, key, measured, budget) for
+    exceeded budgets, and of (metric, key) measured without a budget, e.g., 
+    styles from a newer pygments.
+    """
+    failures, missing = [], []
+    for metric, values in results.items():
+        for key, value in sorted(values.items()):
+            budget = budgets.get(metric, {}).get(key)
+            if budget is None:
+                missing.append((metric, key))
+            elif value > budget:
+                failures.append((metric, key, value, budget))
+    return failures, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update", action="store_true",
+                        help="rewrite the budget file from this run")
+    args = parser.parse_args(argv)
+
+    results = measure()
+    if args.update:
+        budgets = {metric: {k: round(v * (1 + HEADROOM), 2) 
+                            for k, v in sorted(values.items())}
+                   for metric, values in results.items()}
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote budgets to {BUDGET_FILE}")
+        return 0
+
+    with open(BUDGET_FILE) as f:
+        budgets = json.load(f)
+    failures, missing = check(results, budgets)
+    for metric, values in results.items():
+        print(f"{metric}: {len(values)} checked")
+    for metric, key in missing:
+        print(f"  no budget for {metric} {key}, not checked")
+    if not failures:
+        print("All budgets met.")
+        return 0
+    print(f"\n{len(failures)} budget(s) exceeded:")
+    print(f"  {'metric':<28} {'key':<32} {'measured':>10} {'budget':>10}")
+    for metric, key, value, budget in failures:
+        print(f"  {metric:<28} {key:<32} {value:>10.2f} {budget:>10.2f}")
+    print("\nIf the increase is intended, rerun with --update and commit "
+          f"{os.path.basename(BUDGET_FILE)}.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Checks XMLViewer against a stub comm, without a kernel or frontend.
+
+The stub records what the viewer sends and plays the frontend's side: it
+opens comms through the registered target callback, requests line ranges
+and closes the comms. Checks that
+
+- a displayed viewer nothing else refers to survives garbage collection
+  until its last comm is closed, and is released afterwards
+- with two views of one output, each comm gets the replies to its own
+  requests, and closing one leaves the other working
+- replies cover the requested lines and match the full highlighted text,
+  also for chunks evicted from the LRU cache and lexed again from their
+  checkpoints
+- displayed viewers whose comm never opens are not kept beyond MAX_PENDING
+- the bundle has a text/plain fallback
+
+Run from the repository root:
+
+    python benchmarks/viewer_comm.py
+
+Exits 1 if a check fails.
+"""
+import gc
+import os
+import sys
+import weakref
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from display_xml import XML  # noqa: E402
+from display_xml import _comm  # noqa: E402
+from display_xml import viewer as viewer_module  # noqa: E402
+from display_xml.tokens import iter_html_lines  # noqa: E402
+
+
+class StubComm:
+    """
+    Stands in for an ipykernel comm, keeping what the kernel side sends.
+    """
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self._on_msg = None
+        self._on_close = None
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def on_msg(self, callback):
+        self._on_msg = callback
+
+    def on_close(self, callback):
+        self._on_close = callback
+
+    def close(self):
+        self.closed = True
+
+    # frontend side
+
+    def request(self, start, stop):
+        self._on_msg({"content": {"data": {"type": "request",
+                                           "start": start, "stop": stop}}})
+        return self.sent[-1]
+
+    def close_from_frontend(self):
+        self.closed = True
+        self._on_close({"content": {"data": {}}})
+
+
+def check(failures, condition, message):
+    print(f"  {'ok' if condition else 'FAIL'}: {message}")
+    if not condition:
+        failures.append(message)
+
+
+def open_comm(viewer_id):
+    comm = StubComm()
+    viewer_module._open_viewer_comm(
+        comm, {"content": {"data": {"viewer_id": viewer_id}}})
+    return comm
+
+
+def main():
+    # keep the checks independent of whether a kernel is running
+    _comm._registered.add(viewer_module.COMM_TARGET)
+    failures = []
+    rows = 1000
+    doc = XML("<root>" + "".join(f'<row id="{i}">{i}</row>'
+                                 for i in range(rows)) + "</root>")
+    expected = list(iter_html_lines(doc.text))
+
+    bundle = doc.viewer(chunk_size=100, prefetch=1,
+                        cache_size=2)._repr_mimebundle_()
+    check(failures, "text/plain" in bundle, "bundle has a text/plain fallback")
+    payload = bundle[viewer_module.VIEWER_MIME_TYPE]
+    viewer_id = payload["viewer_id"]
+    gc.collect()
+    comm = open_comm(viewer_id)
+    viewer = viewer_module._viewers.get(viewer_id)
+    check(failures, viewer is not None and not comm.closed,
+          "displayed viewer survives gc until its comm opens")
+
+    reply = comm.request(150, 250)
+    check(failures, reply["type"] == "lines" and reply["start"] == 100,
+          "reply starts at the chunk holding the first requested line")
+    check(failures, reply["lines"] == expected[100:300],
+          "reply lines match the full highlighted text")
+
+    reply = comm.request(payload["line_count"] - 1, payload["line_count"])
+    check(failures, reply["lines"] == expected[reply["start"]:],
+          "last chunk ends with the text")
+    check(failures, len(viewer.chunks) <= 2,
+          "served chunks are bounded by the LRU cache")
+    reply = comm.request(420, 430)
+    check(failures, reply["lines"] == expected[400:500],
+          "an evicted chunk is lexed again from its checkpoint")
+
+    other = open_comm(viewer_id)
+    sent = len(comm.sent)
+    reply = comm.request(0, 10)
+    check(failures, len(comm.sent) == sent + 1 and not other.sent
+          and reply["lines"] == expected[:100],
+          "a request is answered on the comm it arrived on")
+    other.close_from_frontend()
+    reply = comm.request(10, 20)
+    check(failures, viewer_id in viewer_module._viewers
+          and reply["lines"] == expected[:100],
+          "closing one of two views leaves the other served")
+
+    ref = weakref.ref(viewer)
+    del viewer, reply
+    comm.close_from_frontend()
+    # the kernel's comm manager drops closed comms
+    comm = other = None
+    gc.collect()
+    check(failures, viewer_id not in viewer_module._viewers
+          and ref() is None, "viewer is released once its last comm closes")
+
+    comm = open_comm(viewer_id)
+    check(failures, comm.closed, "comm for an unknown viewer is closed")
+
+    refs = []
+    for _ in range(viewer_module.MAX_PENDING + 5):
+        unopened = doc.viewer(chunk_size=100)
+        unopened._repr_mimebundle_()
+        refs.append(weakref.ref(unopened))
+    del unopened
+    gc.collect()
+    alive = sum(ref() is not None for ref in refs)
+    check(failures, alive <= viewer_module.MAX_PENDING,
+          f"viewers whose comm never opens are bounded ({alive} kept)")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
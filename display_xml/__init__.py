@@ -1,2 +1,5 @@
 from ._version import __version__
 from .xml import XML
+from .styles import warm_up
+from .series import render_series
+from . import cache
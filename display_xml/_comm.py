@@ -0,0 +1,26 @@
+"""
+Registration of the comm targets the frontend renderer opens to the kernel.
+"""
+_registered = set()
+
+
+def register_target(name, callback):
+    """
+    Registers callback for comms opened on target name with the running 
+    kernel's comm manager, once per target.
+    
+    Does nothing outside of a kernel, e.g. in a terminal IPython session.
+    """
+    if name in _registered:
+        return
+    try:
+        from comm import get_comm_manager
+        manager = get_comm_manager()
+    except ImportError:
+        from IPython import get_ipython
+        kernel = getattr(get_ipython(), "kernel", None)
+        if kernel is None:
+            return
+        manager = kernel.comm_manager
+    manager.register_target(name, callback)
+    _registered.add(name)
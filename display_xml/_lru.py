@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    '''Small thread-safe least-recently-used mapping shared across instances.
+    '''
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        Returns the cached value for key, calling factory() to build it once.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = factory()
+            self[key] = value
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_missing = object()
@@ -0,0 +1,67 @@
+"""
+Tracking of the html outputs the kernel publishes in the current cell, so a
+repeated display can leave out a stylesheet an earlier output still shows.
+"""
+from threading import get_ident
+
+from IPython import get_ipython
+
+# (parent msg_id, keys held by published outputs of that cell still shown)
+_published = [None, set()]
+
+# keys of outputs rendered in the current cell but not seen published yet,
+# with the text that shows an output holds them
+_expected = {}
+
+# (display publisher id, thread id) the hook is registered for; ipykernel
+# keeps hooks per thread
+_hooked = set()
+
+
+def _sync(parent):
+    if _published[0] != parent:
+        _published[0] = parent
+        _published[1].clear()
+        _expected.clear()
+
+
+def _hook(msg):
+    _sync(msg.get("parent_header", {}).get("msg_id"))
+    content = msg.get("content", {})
+    if msg.get("msg_type") == "clear_output":
+        _published[1].clear()
+    elif (msg.get("msg_type") == "display_data"
+          and not content.get("transient", {}).get("display_id")):
+        # outputs with a display_id can be replaced by update_display, so
+        # only outputs without one are relied on
+        html = content.get("data", {}).get("text/html", "")
+        for key, marker in list(_expected.items()):
+            if marker in html:
+                _published[1].add(key)
+                del _expected[key]
+    return msg
+
+
+def shown(key, marker):
+    """
+    Returns whether an output published earlier in the current cell, and
+    not cleared since, holds key.
+    
+    Otherwise the next published output of the cell containing marker is
+    taken to hold key. Outputs are seen through a hook on the kernel's
+    display publisher, so this is always False outside of a kernel, and for
+    outputs it doesn't publish itself, such as a cell's result or outputs
+    with a display_id.
+    """
+    pub = getattr(get_ipython(), "display_pub", None)
+    if getattr(pub, "register_hook", None) is None:
+        return False
+    hooked = (id(pub), get_ident())
+    if hooked not in _hooked:
+        pub.register_hook(_hook)
+        _hooked.add(hooked)
+    _sync((getattr(pub, "parent_header", None) or {}).get("msg_id"))
+    if key in _published[1]:
+        return True
+    _expected[key] = marker
+    return False
@@ -0,0 +1,326 @@
+"""
+Opt-in on-disk cache of rendered output, shared across kernels and restarts.
+
+Rendered html and token streams are stored in a SQLite file, keyed by a hash
+of the input document, the render options, and the versions of display_xml,
+pygments and lxml. A display whose key is found skips parsing, serializing
+and highlighting altogether.
+
+    import display_xml
+    display_xml.cache.enable()          # in the user cache directory
+    display_xml.cache.info()
+    display_xml.cache.clear()
+
+Several kernels can use the same cache file at once: SQLite's write-ahead log
+lets readers proceed while one process writes, and writes wait for each other.
+"""
+from hashlib import sha256
+from threading import Lock
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import time
+
+import lxml.etree as et
+import pygments
+
+from ._version import __version__
+
+#: Default size bound of the cache file's contents, in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    errors TEXT NOT NULL,
+    html TEXT,
+    tokens TEXT,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS renders_accessed ON renders (accessed);
+"""
+
+_cache = None
+
+
+def default_path():
+    """
+    Returns the platform's per-user cache location for the cache file.
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'display_xml', 'renders.sqlite')
+
+
+#: Characters or bytes of the input hashed at a time.
+HASH_CHUNK = 1 << 20
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class _HashWriter:
+    """
+    File-like object hashing what lxml serializes into it, up to max_bytes.
+    """
+    def __init__(self, digest, max_bytes):
+        self.digest = digest
+        self.max_bytes = max_bytes
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.max_bytes is not None and self.written > self.max_bytes:
+            raise _TooLarge
+        self.digest.update(data)
+
+
+def _hash_input(in_obj, max_bytes=None):
+    """
+    Hashes the raw input document, or returns None if it can't be keyed or 
+    is larger than max_bytes.
+    
+    The input is hashed HASH_CHUNK at a time, with str encoded and trees 
+    serialized as they are hashed, so neither is copied whole, and hashing 
+    stops as soon as max_bytes is exceeded.
+    """
+    digest = sha256()
+    if isinstance(in_obj, str):
+        digest.update(b's')
+        size = 0
+        for start in range(0, len(in_obj), HASH_CHUNK):
+            chunk = in_obj[start:start + HASH_CHUNK].encode('utf-8')
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                return None
+            digest.update(chunk)
+    elif isinstance(in_obj, (bytes, mmap.mmap)):
+        if max_bytes is not None and len(in_obj) > max_bytes:
+            return None
+        digest.update(b'b')
+        for start in range(0, len(in_obj), HASH_CHUNK):
+            digest.update(in_obj[start:start + HASH_CHUNK])
+    elif isinstance(in_obj, (et._Element, et._ElementTree)):
+        digest.update(b'e')
+        writer = _HashWriter(digest, max_bytes)
+        # hashes the same bytes as et.tostring(in_obj), as lxml writes them
+        try:
+            if isinstance(in_obj, et._ElementTree):
+                in_obj.write(writer)
+            else:
+                with et.xmlfile(writer) as xf:
+                    xf.write(in_obj)
+        except _TooLarge:
+            return None
+    else:
+        return None
+    return digest.hexdigest()
+
+
+class RenderCache:
+    '''Size-bounded, least-recently-used cache of renders in a SQLite file.
+    '''
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        '''
+        Parameters
+        ----------
+        path : str, optional
+            Location of the cache file (the default is default_path())
+        max_bytes : int, optional
+            Least recently used renders are evicted beyond this total size
+        '''
+        self.path = default_path() if path is None else os.fspath(path)
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, 
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def key(self, in_obj, options, max_bytes=None):
+        """
+        Returns the cache key for rendering in_obj with options (a dict of 
+        json-serializable values), or None if in_obj can't be cached.
+        
+        Inputs larger than max_bytes (trees by their serialized size) aren't
+        cached, and hashing them stops there: str and bytes input that large
+        is cut short by the max_bytes limit, and those displays aren't
+        stored.
+        """
+        input_hash = _hash_input(in_obj, max_bytes)
+        if input_hash is None:
+            return None
+        versions = [__version__, pygments.__version__, et.__version__]
+        key = json.dumps([input_hash, options, versions], sort_keys=True)
+        return sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the stored render for key as a dict, or None.
+        
+        None is also returned when the cache file can't be read (e.g., it 
+        stays locked beyond the timeout), so the display is rendered anew.
+        """
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT digest, errors, html, tokens FROM renders "
+                    "WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            try:
+                self._db.execute(
+                    "UPDATE renders SET accessed = ? WHERE key = ?",
+                    (time.time(), key))
+            except sqlite3.Error:
+                # only the eviction order is lost
+                pass
+        digest, errors, html, tokens = row
+        return {"digest": digest,
+                "errors": [tuple(e) for e in json.loads(errors)],
+                "html": html,
+                "tokens": None if tokens is None else json.loads(tokens)}
+
+    def put(self, key, digest, errors, html=None, tokens=None):
+        """
+        Stores (or adds html/tokens to) the render for key, then evicts the 
+        least recently used renders beyond max_bytes.
+        
+        If the cache file can't be written (e.g., it is locked beyond the 
+        timeout, read-only or the disk is full), nothing is stored.
+        """
+        errors = json.dumps(errors)
+        tokens = None if tokens is None else json.dumps(tokens)
+        size = sum(len(v) for v in (key, digest, errors, html or "", 
+                                    tokens or ""))
+        with self._lock:
+            try:
+                self._write(key, digest, errors, html, tokens, size)
+            except sqlite3.Error:
+                pass
+
+    def _write(self, key, digest, errors, html, tokens, size):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "INSERT INTO renders VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "html = coalesce(excluded.html, html), "
+                "tokens = coalesce(excluded.tokens, tokens), "
+                "size = length(key) + length(digest) + length(errors) "
+                "+ length(coalesce(excluded.html, html, '')) "
+                "+ length(coalesce(excluded.tokens, tokens, '')), "
+                "accessed = excluded.accessed",
+                (key, digest, errors, html, tokens, size, time.time()))
+            self._evict()
+            self._db.execute("COMMIT")
+        except BaseException:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        total = self._db.execute(
+            "SELECT coalesce(sum(size), 0) FROM renders").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, size FROM renders ORDER BY accessed").fetchall()
+        evict = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM renders WHERE key = ?", evict)
+
+    def info(self):
+        """
+        Returns a dict with the cache's path, entries, bytes and max_bytes.
+        """
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT count(*), coalesce(sum(size), 0) FROM renders"
+                ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size,
+                "max_bytes": self.max_bytes}
+
+    def clear(self):
+        """
+        Removes every stored render.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM renders")
+            self._db.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def enable(path=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Turns on the on-disk render cache for every XML display in this process.
+    
+    Parameters
+    ----------
+    
+    path: str, optional
+        Location of the cache file (the default is default_path())
+    max_bytes: int, optional
+        Total size beyond which least recently used renders are evicted
+    
+    Returns
+    -------
+    
+    RenderCache
+    """
+    global _cache
+    disable()
+    _cache = RenderCache(path, max_bytes=max_bytes)
+    return _cache
+
+
+def disable():
+    """
+    Turns off the render cache; the cache file is kept.
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+
+def get_cache():
+    """
+    Returns the enabled RenderCache, or None.
+    """
+    return _cache
+
+
+def info():
+    """
+    Returns RenderCache.info() for the enabled cache, or None.
+    """
+    return None if _cache is None else _cache.info()
+
+
+def clear():
+    """
+    Empties the enabled cache, if any.
+    """
+    if _cache is not None:
+        _cache.clear()
@@ -0,0 +1,282 @@
+"""
+Side-by-side display of the differences between two XML documents.
+"""
+from bisect import bisect_left
+from collections import Counter
+from copy import deepcopy
+from difflib import SequenceMatcher
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import XmlLexer
+import lxml.etree as et
+
+from .styles import get_style_defs, scope_class
+from .xml import XML, _copy_node
+
+
+def _subtree_hashes(root):
+    """
+    Computes a content hash and element count for every subtree of root in 
+    one bottom-up pass. Whitespace around text is ignored.
+    """
+    hashes, sizes = {}, {}
+    for el in reversed(list(root.iter())):
+        children = list(el)
+        hashes[el] = hash((el.tag,
+                           tuple(sorted(el.items())),
+                           (el.text or "").strip(),
+                           (el.tail or "").strip(),
+                           tuple([hashes[child] for child in children])))
+        sizes[el] = 1 + sum([sizes[child] for child in children])
+    return hashes, sizes
+
+
+def _own_content(el):
+    # the tail is shown right after the element, so a changed tail marks it
+    return (el.tag, dict(el.attrib), (el.text or "").strip(), 
+            (el.tail or "").strip())
+
+
+#: Largest gap (rows times columns) between anchors aligned with an LCS.
+LCS_MAX_CELLS = 1 << 16
+
+
+def _unique_anchors(a, b, a1, a2, b1, b2):
+    """
+    Returns the longest increasing run of (i, j) pairs of values that occur
+    exactly once in both a[a1:a2] and b[b1:b2], as in patience diff.
+    """
+    counts_a, counts_b = Counter(a[a1:a2]), Counter(b[b1:b2])
+    where_b = {b[j]: j for j in range(b1, b2) if counts_b[b[j]] == 1}
+    pairs = [(i, where_b[a[i]]) for i in range(a1, a2)
+             if counts_a[a[i]] == 1 and a[i] in where_b]
+    # longest increasing subsequence of the j's, by patience sorting
+    tops, ends, back = [], [], {}
+    for pair in pairs:
+        k = bisect_left(tops, pair[1])
+        back[pair] = ends[k - 1] if k else None
+        if k == len(tops):
+            tops.append(pair[1])
+            ends.append(pair)
+        else:
+            tops[k], ends[k] = pair[1], pair
+    run, pair = [], ends[-1] if ends else None
+    while pair is not None:
+        run.append(pair)
+        pair = back[pair]
+    return run[::-1]
+
+
+def _align(a, b):
+    """
+    Returns opcodes, like SequenceMatcher.get_opcodes, aligning sequences of
+    subtree hashes.
+    
+    Common prefixes and suffixes are matched first, then values unique to 
+    both sides are used as anchors, and only the gaps left between anchors 
+    are aligned with an LCS, when they are small, or position by position.
+    This stays near linear for long runs of repeated siblings, where an LCS 
+    over the whole sequences is quadratic.
+    """
+    pairs = []
+    gaps = [(0, len(a), 0, len(b))]
+    while gaps:
+        a1, a2, b1, b2 = gaps.pop()
+        while a1 < a2 and b1 < b2 and a[a1] == b[b1]:
+            pairs.append((a1, b1))
+            a1, b1 = a1 + 1, b1 + 1
+        while a1 < a2 and b1 < b2 and a[a2 - 1] == b[b2 - 1]:
+            a2, b2 = a2 - 1, b2 - 1
+            pairs.append((a2, b2))
+        if a1 == a2 or b1 == b2:
+            continue
+        anchors = _unique_anchors(a, b, a1, a2, b1, b2)
+        if anchors:
+            pairs.extend(anchors)
+            starts = [(a1, b1)] + [(i + 1, j + 1) for i, j in anchors]
+            stops = anchors + [(a2, b2)]
+            gaps.extend((i1, i2, j1, j2) 
+                        for (i1, j1), (i2, j2) in zip(starts, stops))
+        elif (a2 - a1) * (b2 - b1) <= LCS_MAX_CELLS:
+            matcher = SequenceMatcher(None, a[a1:a2], b[b1:b2], 
+                                      autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                pairs.extend((a1 + i + k, b1 + j + k) for k in range(size))
+        else:
+            size = min(a2 - a1, b2 - b1)
+            pairs.extend((a1 + k, b1 + k) for k in range(size)
+                         if a[a1 + k] == b[b1 + k])
+    opcodes = []
+    i = j = 0
+    for i2, j2 in sorted(pairs) + [(len(a), len(b))]:
+        if i2 > i or j2 > j:
+            opcodes.append(('replace', i, i2, j, j2))
+        if i2 == len(a) and j2 == len(b):
+            break
+        if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == i2:
+            opcodes[-1] = ('equal', opcodes[-1][1], i2 + 1, 
+                           opcodes[-1][3], j2 + 1)
+        else:
+            opcodes.append(('equal', i2, i2 + 1, j2, j2 + 1))
+        i, j = i2 + 1, j2 + 1
+    return opcodes
+
+
+class _Side:
+    """
+    Builds the reduced display tree for one side of the diff.
+    """
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.changed = []
+        self.markers = {}
+
+    def unchanged(self, parent, els):
+        """
+        Collapses els into one comment, merging it with a directly preceding
+        comment for unchanged siblings.
+        """
+        count = sum(self.sizes[el] for el in els)
+        if not count:
+            return
+        last = parent[-1] if len(parent) else None
+        if last is not None and last in self.markers:
+            count += self.markers.pop(last)
+            parent.remove(last)
+        noun = "element" if count == 1 else "elements"
+        marker = et.Comment(f" … {count:,} unchanged {noun} ")
+        self.markers[marker] = count
+        parent.append(marker)
+
+    def whole(self, parent, el):
+        """
+        Copies an inserted or deleted subtree in full, marking all of it.
+        """
+        new = deepcopy(el)
+        new.tail = None
+        parent.append(new)
+        self.changed.extend(new.iter())
+
+
+class XMLDiff:
+    '''Side-by-side rendering of the changes between two XML documents.
+    
+    Subtrees are matched by content hash, so unchanged regions are found in 
+    one pass over each tree and collapsed into a single comment. Children of
+    changed elements are aligned on their hashes (see _align), and only 
+    changed elements are rendered in full and highlighted.
+    '''
+    HTML_TEMPLATE = """
+    <div class={uuid_class}>
+        <style>
+            {style_css}
+        </style>
+        <table>
+            <tr><td style="vertical-align:top">{left}</td>
+                <td style="vertical-align:top">{right}</td></tr>
+        </table>
+    </div>
+    """
+
+    def __init__(self, a, b, style='default'):
+        '''
+        Parameters
+        ----------
+        a, b : str, lxml.etree._Element, lxml.etree._ElementTree, or bytes
+            The old and new documents
+        style : str, optional
+            Pygment style names (the default is 'default')
+        '''
+        self.a = XML._to_element(a)
+        self.b = XML._to_element(b)
+        self.style = style
+        hashes_a, sizes_a = _subtree_hashes(self.a)
+        hashes_b, sizes_b = _subtree_hashes(self.b)
+        self.hashes = {**hashes_a, **hashes_b}
+        self.left, self.right = _Side(sizes_a), _Side(sizes_b)
+        self.left_tree = _copy_node(self.a)
+        self.right_tree = _copy_node(self.b)
+        if self.hashes[self.a] == self.hashes[self.b]:
+            self.left.unchanged(self.left_tree, list(self.a))
+            self.right.unchanged(self.right_tree, list(self.b))
+        else:
+            self._match(self.a, self.b, self.left_tree, self.right_tree)
+        self._html = None
+
+    @property
+    def changed(self):
+        """
+        Whether the two documents differ.
+        """
+        return self.hashes[self.a] != self.hashes[self.b]
+
+    def _match(self, a, b, new_a, new_b):
+        stack = [(a, b, new_a, new_b)]
+        while stack:
+            a, b, new_a, new_b = stack.pop()
+            if _own_content(a) != _own_content(b):
+                self.left.changed.append(new_a)
+                self.right.changed.append(new_b)
+            kids_a, kids_b = list(a), list(b)
+            opcodes = _align([self.hashes[k] for k in kids_a],
+                             [self.hashes[k] for k in kids_b])
+            for op, i1, i2, j1, j2 in opcodes:
+                if op == 'equal':
+                    self.left.unchanged(new_a, kids_a[i1:i2])
+                    self.right.unchanged(new_b, kids_b[j1:j2])
+                    continue
+                olds, news = kids_a[i1:i2], kids_b[j1:j2]
+                # pair up replaced siblings with the same tag so only their 
+                # changed descendants are shown, the rest are whole subtrees
+                for old, new in zip(olds, news):
+                    if old.tag == new.tag and isinstance(old.tag, str):
+                        stack.append((old, new, _copy_node(old, new_a),
+                                      _copy_node(new, new_b)))
+                    else:
+                        self.left.whole(new_a, old)
+                        self.right.whole(new_b, new)
+                for old in olds[len(news):]:
+                    self.left.whole(new_a, old)
+                for new in news[len(olds):]:
+                    self.right.whole(new_b, new)
+
+    def _render_side(self, tree, side):
+        text = et.tostring(tree, pretty_print=True, encoding='unicode')
+        # the reparsed copy has the same nodes in the same order, but knows
+        # which line of the pretty-printed text each of them starts on
+        positions = {id(el): i for i, el in enumerate(tree.iter())}
+        reparsed = list(et.fromstring(text).iter())
+        lines = sorted({reparsed[positions[id(el)]].sourceline
+                        for el in side.changed})
+        formatter = HtmlFormatter(style=self.style, hl_lines=lines)
+        return highlight(text, XmlLexer(), formatter)
+
+    def _sides_html(self):
+        if self._html is None:
+            self._html = (self._render_side(self.left_tree, self.left),
+                          self._render_side(self.right_tree, self.right))
+        return self._html
+
+    @property
+    def uuid_class(self):
+        """
+        Css class derived from the rendered diff, so identical diffs get 
+        identical classes.
+        """
+        return scope_class(self.style, *self._sides_html())
+
+    @property
+    def style_css(self):
+        css_list = [f"div.{self.uuid_class} {x}"
+                    for x in get_style_defs(self.style).split("\n")]
+        return "\n".join(css_list)
+
+    def _repr_html_(self):
+        left, right = self._sides_html()
+        return self.HTML_TEMPLATE.format(
+            uuid_class=self.uuid_class,
+            style_css=self.style_css,
+            left=left,
+            right=right
+            )
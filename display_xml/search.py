@@ -0,0 +1,171 @@
+"""
+Searching a displayed XML document and rendering only the matches.
+"""
+from collections import defaultdict
+import re
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import XmlLexer
+import lxml.etree as et
+
+from ._lru import LRUCache
+from .styles import get_style_defs, scope_class
+
+WORD = re.compile(r"\w+")
+
+
+class SearchIndex:
+    '''Inverted index from text, tags and attributes to elements.
+    
+    The index is built over the pretty-printed text of the whole document 
+    and refers to each element by the line it starts on there, so no element
+    objects are kept alive. Element text and tails are indexed, a tail under 
+    the element it follows. Regular expressions are run against each 
+    distinct text or attribute value once, rather than against every 
+    element, and query results are cached.
+    '''
+    def __init__(self, text, cache_size=64):
+        self.lines = text.splitlines()
+        self.words = defaultdict(list)
+        self.texts = defaultdict(list)
+        self.tags = defaultdict(list)
+        self.attrs = defaultdict(lambda: defaultdict(list))
+        self.results = LRUCache(maxsize=cache_size)
+        # the text is empty when a limit cut the document short before its root
+        elements = et.fromstring(text).iter(et.Element) if text else ()
+        for el in elements:
+            tag, line = el.tag, el.sourceline
+            self.tags[tag].append(line)
+            if tag[0] == "{":
+                self.tags[tag.rpartition("}")[2]].append(line)
+            for name, value in el.items():
+                self.attrs[name][value].append(line)
+            for value in (el.text, el.tail):
+                if value and not value.isspace():
+                    value = value.strip()
+                    self.texts[value].append(line)
+                    for word in set(WORD.findall(value.lower())):
+                        self.words[word].append(line)
+
+    def _text_matches(self, pattern, flags, word):
+        if word:
+            if not WORD.fullmatch(pattern):
+                raise ValueError("word=True needs a pattern of word "
+                                 f"characters only, not {pattern!r}")
+            return self.words.get(pattern.lower(), [])
+        regex = re.compile(pattern, flags)
+        return [line for value, lines in self.texts.items() 
+                if regex.search(value) for line in lines]
+
+    def _attr_matches(self, attrib, flags):
+        if isinstance(attrib, str):
+            attrib = {attrib: None}
+        found = None
+        for name, pattern in attrib.items():
+            values = self.attrs.get(name, {})
+            regex = None if pattern is None else re.compile(pattern, flags)
+            lines = {line for value, lines in values.items()
+                     if regex is None or regex.search(value) 
+                     for line in lines}
+            found = lines if found is None else found & lines
+        return found
+
+    def query(self, pattern=None, tag=None, attrib=None, flags=0, word=False):
+        """
+        Returns the sorted line numbers of the elements matching every 
+        criterion given. See XML.search for the meaning of the arguments.
+        """
+        key = (pattern, tag, 
+               tuple(sorted(attrib.items())) if isinstance(attrib, dict) 
+               else attrib, 
+               flags, word)
+
+        def factory():
+            found = None
+            for lines in self._candidates(pattern, tag, attrib, flags, word):
+                found = set(lines) if found is None else found & set(lines)
+            return sorted(found or ())
+        return self.results.get_or_create(key, factory)
+
+    def _candidates(self, pattern, tag, attrib, flags, word):
+        if pattern is not None:
+            yield self._text_matches(pattern, flags, word)
+        if tag is not None:
+            yield self.tags.get(tag, [])
+        if attrib is not None:
+            yield self._attr_matches(attrib, flags)
+
+
+class SearchResult:
+    '''Display of the lines around the elements matching a search.
+    '''
+    HTML_TEMPLATE = """
+    <div class={uuid_class}>
+        <style>
+            {style_css}
+        </style>
+        <p>{summary}</p>
+        {content}
+    </div>
+    """
+
+    def __init__(self, index, lines, style='default', context=2):
+        '''
+        Parameters
+        ----------
+        index : SearchIndex
+            Index the search was run on
+        lines : list of int
+            Sorted 1-based line numbers, in the index's text, of the matches
+        style : str, optional
+            Pygment style names (the default is 'default')
+        context : int, optional
+            Number of lines shown before and after each match
+        '''
+        self.index = index
+        self.lines = lines
+        self.style = style
+        self.context = context
+
+    def windows(self):
+        """
+        Yields (first_line, last_line) of each block of context to render,
+        merging blocks that touch.
+        """
+        start = stop = None
+        for line in self.lines:
+            lo = max(line - self.context, 1)
+            hi = min(line + self.context, len(self.index.lines))
+            if stop is not None and lo <= stop + 1:
+                stop = hi
+                continue
+            if start is not None:
+                yield start, stop
+            start, stop = lo, hi
+        if start is not None:
+            yield start, stop
+
+    def _render_window(self, start, stop):
+        matched = [line - start + 1 for line in self.lines 
+                   if start <= line <= stop]
+        formatter = HtmlFormatter(style=self.style, linenos='inline',
+                                  linenostart=start, hl_lines=matched)
+        text = "\n".join(self.index.lines[start - 1:stop]) + "\n"
+        return highlight(text, XmlLexer(), formatter)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _repr_html_(self):
+        count = len(self.lines)
+        summary = f"{count:,} matching line{'' if count == 1 else 's'}"
+        content = "<hr/>".join(self._render_window(start, stop) 
+                               for start, stop in self.windows())
+        uuid_class = scope_class(self.style, content)
+        css_list = [f"div.{uuid_class} {x}" 
+                    for x in get_style_defs(self.style).split("\n")]
+        return self.HTML_TEMPLATE.format(uuid_class=uuid_class,
+                                         style_css="\n".join(css_list),
+                                         summary=summary,
+                                         content=content)
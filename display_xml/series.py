@@ -0,0 +1,154 @@
+"""
+Rendering a whole pandas Series (e.g., a DataFrame column) of XML at once.
+"""
+from html import escape
+
+from IPython.display import HTML
+
+from .styles import get_style_defs, scope_class
+from .xml import XML
+
+TABLE_TEMPLATE = """
+<div class={uuid_class}>
+    <style>
+        {style_css}
+    </style>
+    <table>
+        <thead><tr><th></th><th>{name}</th></tr></thead>
+        <tbody>
+        {rows}
+        </tbody>
+    </table>
+</div>
+"""
+
+ROW_TEMPLATE = """<tr><th>{index}</th><td style="text-align:left">{content}</td></tr>"""
+
+ELLIPSIS_ROW = """<tr><th>...</th><td style="text-align:left">...</td></tr>"""
+
+
+MISSING_TEMPLATE = """<pre style="opacity:.5">{value}</pre>"""
+
+
+def _is_missing(value):
+    """
+    Whether value is a missing cell, e.g., None, NaN or pandas.NA.
+    """
+    if value is None:
+        return True
+    try:
+        from pandas.api.types import is_scalar
+        from pandas import isna
+    except ImportError:
+        return isinstance(value, float) and value != value
+    if isinstance(value, (str, bytes)) or not is_scalar(value):
+        return False
+    return bool(isna(value))
+
+
+def _cell_key(value):
+    """
+    Key under which identical cells are rendered only once.
+    """
+    if isinstance(value, (str, bytes)):
+        return value
+    if _is_missing(value):
+        return (None, str(value))
+    # parsed trees aren't hashable by content; the same object still dedupes
+    return id(value)
+
+
+def _render_cell(value, options):
+    # missing cells are shown the way pandas shows them, e.g. None or NaN
+    if _is_missing(value):
+        label = "NaN" if isinstance(value, float) else str(value)
+        return MISSING_TEMPLATE.format(value=escape(label))
+    return XML(value, **options)._highlight()
+
+
+def _render_chunk(values, options):
+    return [_render_cell(value, options) for value in values]
+
+
+def _display_rows(series, max_rows):
+    """
+    Returns the (head, tail) rows pandas would show for series, with tail
+    None when series is not truncated.
+    """
+    if max_rows is None:
+        try:
+            import pandas
+            max_rows = pandas.get_option("display.max_rows")
+        except ImportError:
+            pass
+    if not max_rows or len(series) <= max_rows:
+        return series, None
+    half = max_rows // 2
+    return series.iloc[:half], series.iloc[len(series) - half:]
+
+
+def render_series(series, style='default', max_rows=None, executor=None, 
+                  chunk_size=64, **kwargs):
+    """
+    Renders a Series of XML documents as one html table.
+    
+    All cells share one stylesheet, identical cells are rendered only once, 
+    and, like pandas' own display, only the first and last max_rows/2 rows 
+    of a longer series are rendered.
+    
+    Parameters
+    ----------
+    
+    series: pandas.Series
+        Values of any type accepted by XML; missing values (None, NaN) are
+        shown as such rather than parsed
+    style: str, optional
+        Pygment style names (the default is 'default')
+    max_rows: int, optional
+        Most rows to render (the default is pandas' display.max_rows)
+    executor: concurrent.futures.Executor, optional
+        Pool that renders chunks of distinct cells in parallel
+    chunk_size: int, optional
+        Number of distinct cells rendered per task submitted to executor
+    **kwargs:
+        Passed on to XML, e.g., fold or max_text_len
+    
+    Returns
+    -------
+    
+    IPython.display.HTML
+    """
+    head, tail = _display_rows(series, max_rows)
+    shown = [head] if tail is None else [head, tail]
+
+    unique = {}
+    for part in shown:
+        for value in part:
+            unique.setdefault(_cell_key(value), value)
+    keys, values = list(unique), list(unique.values())
+    options = dict(kwargs, style=style)
+    chunks = [values[i:i + chunk_size] 
+              for i in range(0, len(values), chunk_size)]
+    if executor is None:
+        rendered = [_render_chunk(chunk, options) for chunk in chunks]
+    else:
+        rendered = executor.map(_render_chunk, chunks, 
+                                [options] * len(chunks))
+    contents = dict(zip(keys, (html for chunk in rendered for html in chunk)))
+
+    rows = []
+    for i, part in enumerate(shown):
+        if i:
+            rows.append(ELLIPSIS_ROW)
+        rows.extend(ROW_TEMPLATE.format(index=escape(str(index)),
+                                        content=contents[_cell_key(value)])
+                    for index, value in part.items())
+
+    name = "" if series.name is None else escape(str(series.name))
+    uuid_class = scope_class(style, name, *rows)
+    style_css = "\n".join(f"div.{uuid_class} {x}"
+                          for x in get_style_defs(style).split("\n"))
+    return HTML(TABLE_TEMPLATE.format(uuid_class=uuid_class,
+                                      style_css=style_css,
+                                      name=name,
+                                      rows="\n".join(rows)))
@@ -0,0 +1,202 @@
+// Renders the application/vnd.display_xml.v1+json mimetype emitted by
+// display_xml.XML(..., output='tokens').
+//
+// This module is not a frontend extension by itself and display_xml does
+// not ship one: a JupyterLab (or other) extension has to import it and
+// register it for the mimetypes below. Frontends without it show the
+// one-line text/plain note sent alongside.
+//
+// `render(data, node, kernel)` works in any frontend that hands a renderer
+// the JSON data and a DOM node; `kernel` (anything with createComm) is used
+// to fetch the css of styles the page doesn't have yet, and outputs are left
+// unstyled without it. `rendererFactory` has the shape of a JupyterLab
+// IRendererFactory, with the renderer's `node` to be wrapped in a Widget,
+// and `options.kernel` to be supplied, by the extension that registers it.
+
+export const MIME_TYPE = 'application/vnd.display_xml.v1+json';
+
+// Number of lines turned into DOM nodes at a time while scrolling.
+const LINES_PER_BLOCK = 500;
+
+// Payloads only name their style; its css is fetched from the kernel over
+// data.css_target and installed once per page. The page itself is checked
+// rather than remembering what was installed, so a reload or a cleared
+// output never leaves a style missing.
+const pendingStyles = new Set();
+
+function installStyle(data, kernel) {
+  const selector = `style[data-display-xml-scope="${data.scope}"]`;
+  if (!kernel || document.head.querySelector(selector) ||
+      pendingStyles.has(data.scope)) {
+    return;
+  }
+  pendingStyles.add(data.scope);
+  const comm = kernel.createComm(data.css_target);
+  comm.onMsg = msg => {
+    const reply = msg.content.data;
+    if (reply.type === 'css' && !document.head.querySelector(selector)) {
+      const style = document.createElement('style');
+      style.dataset.displayXmlScope = reply.scope;
+      style.textContent = reply.css;
+      document.head.appendChild(style);
+    }
+  };
+  comm.onClose = () => pendingStyles.delete(data.scope);
+  comm.open({ style: data.style });
+}
+
+// Splits the flat [class, text, class, text, ...] token list into lines of
+// [class, text] pairs.
+function toLines(tokens) {
+  const lines = [[]];
+  for (let i = 0; i < tokens.length; i += 2) {
+    const parts = tokens[i + 1].split('\n');
+    parts.forEach((part, j) => {
+      if (j > 0) {
+        lines.push([]);
+      }
+      if (part) {
+        lines[lines.length - 1].push([tokens[i], part]);
+      }
+    });
+  }
+  return lines;
+}
+
+function renderLine(line) {
+  const frag = document.createDocumentFragment();
+  for (const [cls, text] of line) {
+    if (cls) {
+      const span = document.createElement('span');
+      span.className = cls;
+      span.textContent = text;
+      frag.appendChild(span);
+    } else {
+      frag.appendChild(document.createTextNode(text));
+    }
+  }
+  frag.appendChild(document.createTextNode('\n'));
+  return frag;
+}
+
+export function render(data, node, kernel) {
+  installStyle(data, kernel);
+  const lines = toLines(data.tokens);
+  const outer = document.createElement('div');
+  outer.className = `${data.scope} highlight`;
+  const pre = document.createElement('pre');
+  outer.appendChild(pre);
+  node.appendChild(outer);
+
+  // Only the first block is rendered eagerly; later blocks are appended as
+  // the end of the output scrolls into view.
+  let next = 0;
+  const sentinel = document.createElement('span');
+  const appendBlock = () => {
+    const stop = Math.min(next + LINES_PER_BLOCK, lines.length);
+    for (; next < stop; next++) {
+      pre.insertBefore(renderLine(lines[next]), sentinel);
+    }
+    if (next >= lines.length) {
+      observer.disconnect();
+      sentinel.remove();
+    }
+  };
+  const observer = new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) {
+      appendBlock();
+    }
+  });
+  pre.appendChild(sentinel);
+  appendBlock();
+  if (next < lines.length) {
+    observer.observe(sentinel);
+  }
+}
+
+export const rendererFactory = {
+  safe: true,
+  mimeTypes: [MIME_TYPE],
+  createRenderer: options => ({
+    node: document.createElement('div'),
+    renderModel(model) {
+      this.node.textContent = '';
+      render(model.data[MIME_TYPE], this.node, options.kernel);
+      return Promise.resolve();
+    }
+  })
+};
+
+export const VIEWER_MIME_TYPE = 'application/vnd.display_xml.viewer.v1+json';
+
+// Renders a display_xml.viewer.XMLViewer: a fixed-height viewport whose
+// lines are requested from the kernel over a comm as they scroll into view.
+// `kernel` is the frontend's kernel connection (anything with createComm).
+export function renderViewer(data, node, kernel) {
+  installStyle(data, kernel);
+  const viewport = document.createElement('div');
+  viewport.className = `${data.scope} highlight`;
+  viewport.style.height = `${data.height}px`;
+  viewport.style.overflowY = 'auto';
+  viewport.style.position = 'relative';
+  const spacer = document.createElement('div');
+  const pre = document.createElement('pre');
+  pre.style.position = 'absolute';
+  pre.style.top = '0';
+  pre.style.margin = '0';
+  viewport.appendChild(spacer);
+  viewport.appendChild(pre);
+  node.appendChild(viewport);
+
+  // measure one line to size the spacer for the whole document
+  pre.textContent = 'x';
+  const lineHeight = pre.getBoundingClientRect().height || 16;
+  pre.textContent = '';
+  spacer.style.height = `${data.line_count * lineHeight}px`;
+
+  const lines = new Map();
+  const requested = new Set();
+  const comm = kernel.createComm(data.comm_target);
+
+  const draw = () => {
+    const first = Math.floor(viewport.scrollTop / lineHeight);
+    const count = Math.ceil(data.height / lineHeight) + 1;
+    const html = [];
+    for (let i = first; i < first + count && i < data.line_count; i++) {
+      html.push(lines.has(i) ? lines.get(i) : '');
+    }
+    pre.style.transform = `translateY(${first * lineHeight}px)`;
+    pre.innerHTML = html.join('\n');
+    const chunk = Math.floor(first / data.chunk_size);
+    const last = Math.floor((first + count) / data.chunk_size);
+    for (let c = chunk; c <= last; c++) {
+      if (!requested.has(c) && c * data.chunk_size < data.line_count) {
+        requested.add(c);
+        comm.send({
+          type: 'request',
+          start: c * data.chunk_size,
+          stop: (c + 1) * data.chunk_size
+        });
+      }
+    }
+  };
+
+  comm.onMsg = msg => {
+    const reply = msg.content.data;
+    if (reply.type === 'lines') {
+      reply.lines.forEach((line, i) => lines.set(reply.start + i, line));
+      draw();
+    }
+  };
+  // the kernel closes the comm of a viewer it no longer keeps (expired,
+  // evicted, or gone with a kernel restart)
+  comm.onClose = () => {
+    const note = document.createElement('div');
+    note.textContent = 'This viewer is no longer served by the kernel; ' +
+      'run the cell again to show it.';
+    node.appendChild(note);
+  };
+  comm.open({ viewer_id: data.viewer_id });
+  viewport.addEventListener('scroll', () => requestAnimationFrame(draw));
+  draw();
+}
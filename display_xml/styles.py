@@ -0,0 +1,56 @@
+"""
+Process-level registry of pygments styles and their html formatters.
+
+Discovering styles walks pygments' builtin styles and plugin entry points,
+and building an HtmlFormatter loads its style class and builds its style 
+table, so both are done once per process rather than once per display.
+"""
+from functools import lru_cache
+from hashlib import sha256
+from uuid import UUID
+
+from pygments.formatters import HtmlFormatter
+from pygments.styles import get_all_styles
+
+
+@lru_cache(maxsize=None)
+def all_styles():
+    """
+    Returns the names of all available pygments styles as a tuple.
+    """
+    return tuple(get_all_styles())
+
+
+@lru_cache(maxsize=None)
+def get_formatter(style):
+    """
+    Returns the shared HtmlFormatter for style; do not change its options.
+    """
+    return HtmlFormatter(style=style)
+
+
+@lru_cache(maxsize=None)
+def get_style_defs(style, selector=""):
+    """
+    Returns the css rules for style, each prefixed by selector if given.
+    """
+    return get_formatter(style).get_style_defs(selector)
+
+
+def scope_class(*parts):
+    """
+    Returns a css class derived from the strings that make up an output, so 
+    identical outputs get identical classes, in the same form as 
+    XML.uuid_class.
+    """
+    digest = sha256("\0".join(parts).encode('utf-8')).hexdigest()
+    return "a" + str(UUID(digest[:32]))
+
+
+def warm_up(styles=None):
+    """
+    Builds the formatter and css for styles (default: every style) up front,
+    e.g., at kernel start-up, so the first displays don't pay for it.
+    """
+    for style in all_styles() if styles is None else styles:
+        get_style_defs(style)
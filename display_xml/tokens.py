@@ -0,0 +1,165 @@
+"""
+Compact token streams for frontends that render highlighted XML themselves.
+"""
+from html import escape
+
+from pygments.lexer import ExtendedRegexLexer, LexerContext
+from pygments.lexers import XmlLexer
+from pygments.token import STANDARD_TYPES
+
+from ._comm import register_target
+from ._lru import LRUCache
+from .styles import all_styles, get_style_defs
+
+#: Mimetype of the structured token output, rendered by static/renderer.js.
+MIME_TYPE = "application/vnd.display_xml.v1+json"
+
+#: Comm target the renderer opens to fetch the css of a style it is missing.
+STYLE_COMM_TARGET = "display_xml.styles"
+
+_css_classes = LRUCache(maxsize=1024)
+
+
+def css_class(ttype):
+    """
+    Returns the short pygments css class (e.g., "nt") for a token type.
+    
+    Token types without a class of their own use their closest parent's.
+    """
+    def factory():
+        t = ttype
+        while t not in STANDARD_TYPES:
+            t = t.parent
+        return STANDARD_TYPES[t]
+    return _css_classes.get_or_create(ttype, factory)
+
+
+def compact_tokens(text):
+    """
+    Lexes text and merges adjacent tokens that share a css class.
+    
+    Returns a flat list alternating css class and text, e.g. 
+    ``["nt", "<a>", "", "1", "nt", "</a>"]``; an empty class means unstyled.
+    """
+    flat = []
+    for ttype, value in XmlLexer().get_tokens(text):
+        cls = css_class(ttype)
+        if flat and flat[-2] == cls:
+            flat[-1] += value
+        else:
+            flat += [cls, value]
+    return flat
+
+
+class _ResumableXmlLexer(ExtendedRegexLexer):
+    """
+    XmlLexer whose position and state stack can be saved and resumed.
+    """
+    tokens = XmlLexer.tokens
+    flags = XmlLexer.flags
+
+
+def _span(cls, text):
+    if cls:
+        return f'<span class="{cls}">{escape(text, False)}</span>'
+    return escape(text, False)
+
+
+def lex_lines(text, checkpoint=None):
+    """
+    Lazily lexes text, yielding (line, html, checkpoint) for each 
+    self-contained html line, from checkpoint on if given.
+    
+    Lines are numbered from 0, and yielded without their trailing newline;
+    tokens spanning several lines are split so every line closes its spans.
+    Each line comes with a checkpoint, (position, state stack, line) of the
+    token its line break falls in, from which lex_lines yields that line 
+    again without lexing the text before it. When resuming mid-line, the 
+    first, partial line is not yielded.
+    """
+    pos, stack, line = checkpoint or (0, ("root",), 0)
+    context = LexerContext(text, pos, list(stack))
+    partial = pos > 0 and text[pos - 1] != "\n"
+    current, parts = (pos, tuple(stack), line), []
+    lexer = _ResumableXmlLexer()
+    for _, ttype, value in lexer.get_tokens_unprocessed(context=context):
+        cls = css_class(ttype)
+        if "\n" not in value:
+            parts.append(_span(cls, value))
+            continue
+        # the generator is suspended before the context moves past the token
+        here = (context.pos, tuple(context.stack), line)
+        for i, part in enumerate(value.split("\n")):
+            if i > 0:
+                if not partial:
+                    yield line, "".join(parts), current
+                partial, parts = False, []
+                line += 1
+                current = here
+            if part:
+                parts.append(_span(cls, part))
+    if parts and not partial:
+        yield line, "".join(parts), current
+
+
+def iter_html_lines(text):
+    """
+    Lazily lexes text, yielding one self-contained html line at a time.
+    
+    Tokens spanning several lines are split so every line closes its spans;
+    lines are yielded without their trailing newline.
+    """
+    for _, html, _ in lex_lines(text):
+        yield html
+
+
+def style_scope(style):
+    """
+    Css class that scopes a pygments style's rules in the frontend renderer.
+    """
+    return f"display-xml-{style}"
+
+
+def token_payload(tokens, style):
+    """
+    Builds the MIME_TYPE payload for compact_tokens highlighted with style.
+    
+    The payload only refers to the style; the renderer fetches its css over
+    a comm the first time a page needs it (see style_reference).
+    """
+    payload = {"version": 1, "tokens": tokens}
+    return style_reference(payload, style)
+
+
+def style_reference(payload, style):
+    """
+    Adds style, its css scope and the comm target serving its css to 
+    payload.
+    
+    Looking up the page rather than kernel state, the renderer only opens a 
+    comm for a style whose css isn't in the page yet, so a reloaded page or 
+    a cleared output fetches it again.
+    """
+    register_target(STYLE_COMM_TARGET, _open_style_comm)
+    payload.update(style=style, scope=style_scope(style), 
+                   css_target=STYLE_COMM_TARGET)
+    return payload
+
+
+def _open_style_comm(comm, open_msg):
+    style = open_msg["content"]["data"].get("style")
+    if style in all_styles():
+        comm.send({"type": "css",
+                   "style": style,
+                   "scope": style_scope(style),
+                   "css": get_style_defs(style, f".{style_scope(style)}")})
+    comm.close()
+
+
+def renderer_note(line_count, style, output):
+    """
+    Short text/plain stand-in for frontends without the renderer.
+    """
+    return (f"<display_xml {output} output: {line_count:,} lines in style "
+            f"{style!r}; showing it needs static/renderer.js registered "
+            "with the frontend>")
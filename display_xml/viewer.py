@@ -0,0 +1,208 @@
+"""
+Virtualized display of very long XML: the kernel serves highlighted lines and
+the frontend asks for the line ranges visible in its scroll viewport over a
+Jupyter comm.
+"""
+from collections import OrderedDict
+from uuid import uuid4
+import time
+
+from ._comm import register_target
+from ._lru import LRUCache
+from .tokens import lex_lines, renderer_note, style_reference
+
+#: Mimetype of the viewer output, rendered by renderViewer in static/renderer.js.
+VIEWER_MIME_TYPE = "application/vnd.display_xml.viewer.v1+json"
+
+#: Comm target the frontend opens to request lines from a viewer.
+COMM_TARGET = "display_xml.viewer"
+
+#: Seconds a displayed viewer waits for the frontend to open its comm.
+PENDING_TIMEOUT = 120
+
+#: Most displayed viewers kept waiting for their comm to open.
+MAX_PENDING = 16
+
+#: Most viewers with open comms kept alive; a frontend that goes away (e.g.,
+#: on a page reload) may never close its comms.
+MAX_VIEWERS = 32
+
+# Viewers with open comms, least recently used first, kept alive until the 
+# last of their comms closes or MAX_VIEWERS more recent ones are in use
+_viewers = OrderedDict()
+
+# Displayed viewers waiting for a comm: viewer_id -> (viewer, deadline), in
+# the order they were displayed. Without the renderer (e.g., nbconvert) no
+# comm ever opens, so they expire rather than keep their documents alive.
+_pending = OrderedDict()
+
+
+def _touch(viewer):
+    """
+    Marks viewer as the most recently used, closing the comms of the least
+    recently used viewers beyond MAX_VIEWERS.
+    """
+    _viewers[viewer.viewer_id] = viewer
+    _viewers.move_to_end(viewer.viewer_id)
+    while len(_viewers) > MAX_VIEWERS:
+        _, evicted = _viewers.popitem(last=False)
+        comms, evicted.comms = evicted.comms, []
+        for comm in comms:
+            comm.close()
+
+
+def _prune_pending(now):
+    while _pending:
+        viewer_id, (_, deadline) = next(iter(_pending.items()))
+        if deadline > now and len(_pending) <= MAX_PENDING:
+            break
+        del _pending[viewer_id]
+
+
+class XMLViewer:
+    '''Serves highlighted lines of an XML display in chunks over a comm.
+    
+    Lines are lexed lazily, as far as the requested chunks plus the
+    prefetched chunks after them. Served chunks are kept in an LRU cache,
+    and the lexer state at the start of every chunk reached is kept as a
+    checkpoint, so a chunk evicted from the cache is lexed again from its
+    own start rather than from the start of the document.
+    
+    Once displayed, a viewer is kept alive until the frontend opens a comm
+    to it, for up to PENDING_TIMEOUT seconds, and then until the last of its
+    comms closes, or until it is among the least recently used beyond 
+    MAX_VIEWERS, when its comms are closed. Each view of the output opens 
+    its own comm, and requests are answered on the comm they arrive on. Any
+    object with ``send(data)``, ``on_msg(callback)``, ``on_close(callback)``
+    and ``close()`` methods can be attached as a comm, which makes the 
+    viewer testable without a kernel.
+    '''
+    def __init__(self, xml, chunk_size=200, prefetch=1, cache_size=64,
+                 height=400):
+        '''
+        Parameters
+        ----------
+        xml : display_xml.XML
+            The display whose text is served
+        chunk_size : int, optional
+            Number of lines sent per chunk
+        prefetch : int, optional
+            Number of chunks prepared ahead of the last one requested
+        cache_size : int, optional
+            Number of served chunks kept in the LRU cache
+        height : int, optional
+            Height of the scroll viewport in pixels
+        '''
+        self.xml = xml
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.height = height
+        self.chunks = LRUCache(maxsize=cache_size)
+        self.line_count = xml.text.count("\n")
+        self.viewer_id = uuid4().hex
+        self.comms = []
+        # chunk index -> lex_lines checkpoint its first line is lexed from
+        self._checkpoints = {0: None}
+
+    def _lex_chunk(self, index):
+        """
+        Lexes chunk index from the closest checkpoint at or before it,
+        keeping the checkpoints of the chunks passed on the way.
+        """
+        start = index * self.chunk_size
+        stop = start + self.chunk_size
+        known = max(k for k in self._checkpoints if k <= index)
+        lines = []
+        for line, html, checkpoint in lex_lines(self.xml.text,
+                                                self._checkpoints[known]):
+            if line % self.chunk_size == 0:
+                self._checkpoints.setdefault(line // self.chunk_size,
+                                             checkpoint)
+            if line >= stop:
+                break
+            if line >= start:
+                lines.append(html)
+        return lines
+
+    def chunk(self, index):
+        """
+        Returns the list of html lines making up chunk index.
+        """
+        return self.chunks.get_or_create(index, lambda: self._lex_chunk(index))
+
+    def lines(self, start, stop):
+        """
+        Returns the chunks covering lines [start, stop) as
+        {"start": first line of the first chunk, "lines": [...]}, and
+        prepares the following chunks ahead of time.
+        """
+        first = max(start, 0) // self.chunk_size
+        last = max(stop - 1, start, 0) // self.chunk_size
+        lines = []
+        for index in range(first, last + 1):
+            lines.extend(self.chunk(index))
+        for index in range(last + 1, last + 1 + self.prefetch):
+            if index * self.chunk_size < self.line_count:
+                self.chunk(index)
+        return {"start": first * self.chunk_size, "lines": lines}
+
+    def attach(self, comm):
+        """
+        Serves line requests arriving on comm, replying on that comm.
+        """
+        self.comms.append(comm)
+        _touch(self)
+        comm.on_msg(lambda msg: self._handle_msg(comm, msg))
+        comm.on_close(lambda msg: self._handle_close(comm))
+
+    def _handle_msg(self, comm, msg):
+        data = msg["content"]["data"]
+        if data.get("type") == "request":
+            _touch(self)
+            reply = self.lines(data["start"], data["stop"])
+            reply["type"] = "lines"
+            comm.send(reply)
+
+    def _handle_close(self, comm):
+        if comm in self.comms:
+            self.comms.remove(comm)
+        if not self.comms:
+            _viewers.pop(self.viewer_id, None)
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        register_comm_target()
+        if self.viewer_id not in _viewers:
+            now = time.monotonic()
+            _pending[self.viewer_id] = (self, now + PENDING_TIMEOUT)
+            _pending.move_to_end(self.viewer_id)
+            _prune_pending(now)
+        payload = {"version": 1,
+                   "viewer_id": self.viewer_id,
+                   "comm_target": COMM_TARGET,
+                   "line_count": self.line_count,
+                   "chunk_size": self.chunk_size,
+                   "height": self.height}
+        style_reference(payload, self.xml.style)
+        note = renderer_note(self.line_count, self.xml.style, "viewer")
+        return {VIEWER_MIME_TYPE: payload, "text/plain": note}
+
+
+def _open_viewer_comm(comm, open_msg):
+    viewer_id = open_msg["content"]["data"].get("viewer_id")
+    _prune_pending(time.monotonic())
+    viewer = _viewers.get(viewer_id)
+    if viewer is None and viewer_id in _pending:
+        viewer = _pending.pop(viewer_id)[0]
+    if viewer is None:
+        comm.close()
+    else:
+        viewer.attach(comm)
+
+
+def register_comm_target():
+    """
+    Registers COMM_TARGET with the running kernel's comm manager, once.
+    
+    Does nothing outside of a kernel, e.g. in a terminal IPython session.
+    """
+    register_target(COMM_TARGET, _open_viewer_comm)
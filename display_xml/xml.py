@@ -1,14 +1,454 @@
 from pygments import highlight
 from pygments.lexers import XmlLexer
 from pygments.formatters import HtmlFormatter
-from pygments.styles import get_all_styles
 import lxml.etree as et
-from uuid import uuid4
+from uuid import UUID
+from hashlib import sha256
+from html import escape
+from itertools import repeat
+from threading import get_ident
+import mmap
+import os
+import time
+
+from ._lru import LRUCache
+from ._outputs import shown
+from .styles import all_styles, get_formatter, get_style_defs
+from .tokens import MIME_TYPE, compact_tokens, renderer_note, token_payload
+from . import cache
+from .search import SearchIndex, SearchResult
+from .viewer import XMLViewer
 
 from IPython.display import display
 
 no_blank_parser = et.XMLParser(remove_blank_text=True)
 
+# lxml refuses str with an encoding declaration, those are parsed as utf-8
+utf8_parser = et.XMLParser(remove_blank_text=True, encoding='utf-8')
+
+#: Number of bytes handed to the feed parser at a time when parsing buffers.
+CHUNK_SIZE = 1 << 20
+
+#: Most elements shown of a display cut short by a limit, unless max_elements
+#: is set, so serializing and highlighting the part parsed stay bounded.
+TRUNCATED_MAX_ELEMENTS = 10000
+
+
+#: Names of the resource limits accepted by XML(..., limits={...}).
+LIMIT_NAMES = ('max_bytes', 'max_depth', 'max_elements', 'timeout')
+
+
+class LimitExceeded(Exception):
+    """
+    Raised internally when parsing or walking a document exceeds a limit.
+    
+    Attributes
+    ----------
+    limit: str
+        The name of the limit, one of LIMIT_NAMES
+    value: int or float
+        The limit's configured value
+    """
+    def __init__(self, limit, value):
+        super().__init__(f"{limit} limit of {value:,} exceeded")
+        self.limit = limit
+        self.value = value
+
+
+class _Guard:
+    """
+    Tracks depth, element count and elapsed time over start/end events.
+    """
+    def __init__(self, limits):
+        self.max_bytes = limits.get('max_bytes')
+        self.max_depth = limits.get('max_depth')
+        self.max_elements = limits.get('max_elements')
+        self.timeout = limits.get('timeout')
+        self.active = any(limits.get(name) is not None for name in LIMIT_NAMES)
+        self.deadline = None
+        if self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+        self.depth = self.elements = 0
+        self.root = None
+
+    def check_time(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitExceeded('timeout', self.timeout)
+
+    def events(self, events):
+        for event, el in events:
+            if event == 'end':
+                self.depth -= 1
+                continue
+            if self.root is None:
+                self.root = el
+            self.depth += 1
+            self.elements += 1
+            if self.max_depth is not None and self.depth > self.max_depth:
+                raise LimitExceeded('max_depth', self.max_depth)
+            if (self.max_elements is not None 
+                    and self.elements > self.max_elements):
+                raise LimitExceeded('max_elements', self.max_elements)
+            if self.elements % 4096 == 0:
+                self.check_time()
+
+
+def _release_pages(buf, start, length):
+    """
+    Lets the OS drop the pages of a file mapping that have been parsed, so 
+    they don't stay resident for the rest of the display's construction.
+    """
+    if not isinstance(buf, mmap.mmap) or not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    aligned = start - start % mmap.PAGESIZE
+    try:
+        stop = min(start + length, len(buf))
+        buf.madvise(mmap.MADV_DONTNEED, aligned, stop - aligned)
+    except (OSError, ValueError):
+        pass
+
+
+def _parse_buffer(buf, chunk_size=CHUNK_SIZE, limits={}):
+    """
+    Parses a str or any sliceable bytes buffer (e.g., an mmap) by feeding it
+    to lxml in chunks, so no more than ``chunk_size`` bytes are copied at any
+    one time.
+    
+    When limits are given, they are checked as the parse streams along, and
+    the parse stops at the first one exceeded. max_bytes counts the utf-8 
+    encoding of str input.
+    
+    Returns
+    -------
+    
+    (root, limit_hit): the root element, partial if a limit was exceeded or
+    None if it was exceeded before the root element started, and the 
+    LimitExceeded (or None)
+    """
+    guard = _Guard(limits)
+    options = dict(remove_blank_text=True)
+    if isinstance(buf, str) and (guard.max_bytes is not None 
+                                 or buf.lstrip().startswith('<?xml')):
+        # lxml refuses str with an encoding declaration; max_bytes + 1 
+        # characters encode to more than max_bytes bytes if there are more
+        if guard.max_bytes is not None:
+            buf = buf[:guard.max_bytes + 1]
+        buf = buf.encode('utf-8')
+        options['encoding'] = 'utf-8'
+    if not guard.active:
+        parser = et.XMLParser(**options)
+        for start in range(0, len(buf), chunk_size):
+            parser.feed(buf[start:start + chunk_size])
+            _release_pages(buf, start, chunk_size)
+        return parser.close(), None
+
+    parser = et.XMLPullParser(events=('start', 'end'), **options)
+    end = len(buf)
+    if guard.max_bytes is not None:
+        end = min(end, guard.max_bytes)
+    try:
+        try:
+            for start in range(0, end, chunk_size):
+                parser.feed(buf[start:min(start + chunk_size, end)])
+                _release_pages(buf, start, chunk_size)
+                guard.events(parser.read_events())
+                guard.check_time()
+            if end < len(buf):
+                raise LimitExceeded('max_bytes', guard.max_bytes)
+            root = parser.close()
+        except et.XMLSyntaxError:
+            # libxml2's own limits (e.g., on depth) can stop a chunk before
+            # its events are read; if ours were exceeded first, report them
+            guard.events(parser.read_events())
+            raise
+        guard.events(parser.read_events())
+        return root, None
+    except LimitExceeded as hit:
+        return guard.root, hit
+
+
+def _check_element(root, limits):
+    """
+    Walks an already parsed tree, returning the first LimitExceeded (or None).
+    """
+    guard = _Guard(limits)
+    try:
+        guard.events(et.iterwalk(root, events=('start', 'end')))
+    except LimitExceeded as hit:
+        return hit
+
+
+#: Compiled XSLT stylesheets shared by every XML instance.
+xslt_cache = LRUCache(maxsize=32)
+
+
+def _source_key(source):
+    """
+    Cache key for a stylesheet or schema given as a path or an lxml tree.
+    
+    Paths are keyed by their modification time so edited files are reloaded.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        path = os.path.abspath(os.fspath(source))
+        return (path, os.stat(path).st_mtime_ns)
+    elif isinstance(source, (et._ElementTree, et._Element)):
+        return et.tostring(source)
+    else:
+        raise TypeError(f"{source} is of type {type(source)}. Only paths, "
+                        "lxml.etree._ElementTree, or lxml.etree._Element are "
+                        "accepted.")
+
+
+def compile_xslt(transform):
+    """
+    Returns a compiled et.XSLT for a path or tree, compiling it at most once.
+    """
+    if isinstance(transform, et.XSLT):
+        return transform
+    key = _source_key(transform)
+    if isinstance(transform, (et._ElementTree, et._Element)):
+        return xslt_cache.get_or_create(key, lambda: et.XSLT(transform))
+    return xslt_cache.get_or_create(key, lambda: et.XSLT(et.parse(key[0])))
+
+
+#: Compiled XMLSchema / RelaxNG validators shared by every XML instance.
+schema_cache = LRUCache(maxsize=32)
+
+RELAXNG_NS = "http://relaxng.org/ns/structure/1.0"
+
+
+def compile_schema(schema):
+    """
+    Returns a compiled et.XMLSchema or et.RelaxNG for a path or tree.
+    
+    A validator's error log is not safe to share between threads, so each 
+    thread compiles a given schema once and reuses it from then on.
+    """
+    if isinstance(schema, (et.XMLSchema, et.RelaxNG)):
+        return schema
+    key = (_source_key(schema), get_ident())
+
+    def factory():
+        if isinstance(schema, (et._ElementTree, et._Element)):
+            tree = schema
+        else:
+            tree = et.parse(key[0][0])
+        root = tree.getroot() if isinstance(tree, et._ElementTree) else tree
+        if et.QName(root).namespace == RELAXNG_NS:
+            return et.RelaxNG(tree)
+        return et.XMLSchema(tree)
+    return schema_cache.get_or_create(key, factory)
+
+
+def validation_errors(in_obj, schema):
+    """
+    Validates in_obj against schema, returning a list of (line, message).
+    
+    Both arguments may be anything XML or compile_schema accepts; pass str or
+    bytes documents and a schema path when using a process pool.
+    """
+    validator = compile_schema(schema)
+    validator.validate(XML._to_element(in_obj))
+    return [(error.line, error.message) for error in validator.error_log]
+
+
+def _invalid_elements(root, schema):
+    """
+    Validates root against schema, returning a list of (element, message).
+    
+    The element is the one each error is about, or None if the error isn't 
+    tied to one.
+    """
+    validator = compile_schema(schema)
+    if validator.validate(root):
+        return []
+    errors = [(error.path, error.message) for error in validator.error_log]
+    # libxml2 reports the node path of each error, getpath produces the same
+    wanted = {path for path, _ in errors if path}
+    found = {}
+    tree = root.getroottree()
+    for el in root.iter(et.Element):
+        if not wanted:
+            break
+        path = tree.getpath(el)
+        if path in wanted:
+            found[path] = el
+            wanted.discard(path)
+    return [(found.get(path), message) for path, message in errors]
+
+
+class AnnotatedHtmlFormatter(HtmlFormatter):
+    """
+    HtmlFormatter that highlights lines with a tooltip holding a message.
+    
+    Parameters
+    ----------
+    annotations: dict
+        Maps 1-based line numbers to the message to show for that line
+    """
+    def __init__(self, annotations={}, **options):
+        super().__init__(**options)
+        self.annotations = annotations
+
+    def wrap(self, source, *args):
+        return super().wrap(self._annotate(source), *args)
+
+    def _annotate(self, source):
+        lineno = 0
+        for is_line, text in source:
+            if is_line:
+                lineno += 1
+                if lineno in self.annotations:
+                    title = escape(self.annotations[lineno])
+                    text = f'<span class="hll" title="{title}">{text}</span>'
+            yield is_line, text
+
+
+def _shape_hashes(root):
+    """
+    Computes a structural hash for every node in a single bottom-up pass.
+    
+    Two subtrees share a hash when their tags, attribute names and the shapes
+    of their children match, regardless of text or attribute values.
+    """
+    hashes = {}
+    # in document order every child follows its parent, so reversing it
+    # guarantees children are hashed before the parents that need them
+    for el in reversed(list(root.iter())):
+        hashes[el] = hash((el.tag,
+                           tuple(sorted(el.attrib.keys())),
+                           tuple(hashes[child] for child in el)))
+    return hashes
+
+
+def _clip(value, limit):
+    """
+    Elides all but the first limit characters of value with a length marker.
+    """
+    if value is None or limit is None or len(value) <= limit:
+        return value
+    return f"{value[:limit]}\u2026[+{len(value) - limit:,} chars]"
+
+
+def _copy_node(el, parent=None, max_text_len=None, max_attr_len=None):
+    """
+    Shallow copy of a single node (without its children), appended to parent.
+    
+    Text, tails and attribute values longer than max_text_len/max_attr_len 
+    characters are clipped in the copy.
+    """
+    if el.tag is et.Comment:
+        new = et.Comment(_clip(el.text, max_text_len))
+    elif el.tag is et.ProcessingInstruction:
+        new = et.ProcessingInstruction(el.target, _clip(el.text, max_text_len))
+    elif el.tag is et.Entity:
+        new = et.Entity(el.name)
+    else:
+        attrib = el.attrib
+        if max_attr_len is not None:
+            attrib = {k: _clip(v, max_attr_len) for k, v in el.items()}
+        if parent is None:
+            new = et.Element(el.tag, attrib, nsmap=el.nsmap)
+        else:
+            new = et.SubElement(parent, el.tag, attrib, nsmap=el.nsmap)
+        new.text = _clip(el.text, max_text_len)
+        new.tail = _clip(el.tail, max_text_len)
+        return new
+    if parent is not None:
+        parent.append(new)
+    new.tail = _clip(el.tail, max_text_len)
+    return new
+
+
+def _fold_runs(children, hashes, fold_min, keep=()):
+    """
+    Yields (exemplar, run_length) for each run of same-shaped siblings.
+    
+    Siblings in keep are never folded into a run.
+    """
+    run = []
+    for child in children:
+        if child in keep:
+            yield from _split_run(run, fold_min)
+            run = []
+            yield child, 1
+            continue
+        if run and hashes[child] != hashes[run[0]]:
+            yield from _split_run(run, fold_min)
+            run = []
+        run.append(child)
+    yield from _split_run(run, fold_min)
+
+
+def _split_run(run, fold_min):
+    if len(run) >= fold_min:
+        yield run[0], len(run)
+    else:
+        yield from ((el, 1) for el in run)
+
+
+def _display_copy(root, fold_min=None, max_text_len=None, max_attr_len=None,
+                  max_depth=None, max_elements=None, keep=(), copies=None,
+                  deadline=None):
+    """
+    Copies root for display, leaving the caller's tree untouched.
+    
+    If fold_min is given, only one exemplar is kept per run of at least 
+    fold_min structurally identical siblings, followed by a comment counting
+    the siblings that were folded. Long text and attribute values are clipped
+    to max_text_len and max_attr_len characters. Children below max_depth and
+    nodes after the first max_elements (in document order) are left out, with
+    a comment saying so, as are nodes reached after deadline (a
+    time.monotonic() value).
+    
+    Nodes in keep are never folded away. If copies is a dict, it is filled 
+    with a mapping from each copied node to its copy.
+    
+    Only what is displayed gets copied, so the copy grows with the number of
+    distinct shapes (when folding) and not with the size of text payloads.
+    """
+    copy_options = dict(max_text_len=max_text_len, max_attr_len=max_attr_len)
+    hashes = _shape_hashes(root) if fold_min else None
+    new_root = None
+    copied = 0
+    # (iterator over (node, run length), parent copy, depth) per level being
+    # copied; children are only listed as they are reached, so a copy cut
+    # short by a limit costs what was copied
+    stack = [(iter([(root, 1)]), None, 1)]
+    while stack:
+        runs, new_parent, depth = stack[-1]
+        el, count = next(runs, (None, 0))
+        if el is None:
+            stack.pop()
+            continue
+        # the root is always copied, so there is something to display
+        if new_parent is not None and (
+                (max_elements is not None and copied >= max_elements)
+                or (deadline is not None and time.monotonic() > deadline)):
+            new_parent.append(et.Comment(" \u2026 more not shown "))
+            break
+        copied += 1
+        new_el = _copy_node(el, new_parent, **copy_options)
+        if copies is not None:
+            copies[el] = new_el
+        if new_root is None:
+            new_root = new_el
+        if count > 1:
+            marker = et.Comment(f" \u00d7 {count - 1:,} similar ")
+            marker.tail, new_el.tail = new_el.tail, None
+            new_parent.append(marker)
+        if max_depth is not None and depth >= max_depth and len(el):
+            noun = "child" if len(el) == 1 else "children"
+            new_el.append(et.Comment(f" \u2026 {len(el):,} {noun} not shown "))
+            continue
+        if fold_min:
+            children = _fold_runs(el, hashes, fold_min, keep)
+        else:
+            children = ((child, 1) for child in el)
+        stack.append((children, new_el, depth + 1))
+    return new_root
+
+
 class XML:
     '''Class for displaying XML in a pretty way that supports pygments styles.
     '''
@@ -27,8 +467,20 @@ class XML:
         "<hr/>"
         )
 
+    #: Whether repeated displays of an identical document within one cell 
+    #: execution leave out the stylesheet an earlier display of it, published
+    #: in the same cell and still shown, already put in the page. Only has an
+    #: effect in a kernel.
+    dedupe = False
+
+    #: Resource limits applied to every display unless overridden by the 
+    #: limits argument; None means unlimited. See XML.__init__.
+    default_limits = dict.fromkeys(LIMIT_NAMES)
+
     def __init__(self, in_obj, style='default', template=None, 
-                 extras={}):
+                 extras={}, fold=False, fold_min=2, transform=None,
+                 schema=None, output='html', max_text_len=None,
+                 max_attr_len=None, limits=None, chunk_size=CHUNK_SIZE):
         '''
         Parameters
         ----------
@@ -36,31 +488,411 @@ class XML:
             Object to be displayed as html
         style : str, optional
             Pygment style names (the default is 'default')
+        fold : bool, optional
+            Whether to fold runs of structurally identical siblings into one
+            exemplar and a "× N similar" marker (the default is False)
+        fold_min : int, optional
+            Shortest run of identical siblings that gets folded (default 2)
+        transform : str, lxml.etree._ElementTree, or lxml.etree.XSLT, optional
+            XSLT stylesheet (or path to one) applied before display; compiled
+            stylesheets are cached across instances
+        schema : str, lxml.etree._ElementTree, XMLSchema, or RelaxNG, optional
+            XML Schema or RelaxNG schema (or path to one); lines that fail
+            validation are highlighted with the error as a tooltip
+        output : {'html', 'tokens', 'viewer'}, optional
+            'tokens' sends a compact token stream and a style reference as
+            the application/vnd.display_xml.v1+json mimetype, instead of an
+            html string; it is rendered by display_xml/static/renderer.js, 
+            which a frontend extension has to register (none is shipped), 
+            and other frontends show a one-line text/plain note. 
+            'viewer' shows a fixed-height viewport that fetches highlighted
+            lines from the kernel as it scrolls (see XML.viewer)
+        max_text_len : int, optional
+            Text longer than this many characters is elided in the display
+            with a length marker; the parsed tree is not modified, and a
+            schema validates the full values
+        max_attr_len : int, optional
+            Same as max_text_len, for attribute values
+        limits : dict, optional
+            Resource limits, overriding XML.default_limits: 'max_bytes' of
+            str/bytes input parsed (str counted in its utf-8 encoding), 
+            'max_depth', 'max_elements', and 'timeout' in seconds for 
+            parsing. When one is exceeded, what was parsed within the limits
+            is displayed (only a note if the root element wasn't reached), 
+            and the limit is noted in the output and kept on XML.limit_hit.
+            That part is shown up to max_elements elements 
+            (TRUNCATED_MAX_ELEMENTS if not set), and copying it for display
+            is given the timeout again
+        chunk_size : int, optional
+            Bytes fed to the parser at a time for mmap input or when limits
+            are set
         '''
+        if output not in ('html', 'tokens', 'viewer'):
+            raise ValueError("output must be 'html', 'tokens' or 'viewer', "
+                             f"not {output}")
         if template is None:
             template = self.HTML_TEMPLATE
         
-        if isinstance(in_obj, (str, bytes)):
-            self.xml = et.fromstring(in_obj, parser=no_blank_parser)
+        self.style = style
+        self.template = template
+        self.extras = extras
+        self.output = output
+        self.fold = fold
+        self.fold_min = fold_min
+        self.max_text_len = max_text_len
+        self.max_attr_len = max_attr_len
+        self.limits = {**self.default_limits, **(limits or {})}
+        self._in_obj = in_obj
+        self._path = None
+        self._transform = transform
+        self._schema = schema
+        self._chunk_size = chunk_size
+        self._viewer = None
+        self._search_index = None
+        self._built = False
+        self._digest = None
+        self._cache_key = None
+        self._cached = None
+        render_cache = cache.get_cache()
+        if render_cache is not None:
+            options = self._cache_options()
+            if options is not None:
+                self._cache_key = render_cache.key(
+                    in_obj, options, max_bytes=self.limits.get('max_bytes'))
+        if self._cache_key is not None:
+            self._cached = render_cache.get(self._cache_key)
+        if self._cached is None:
+            self._build()
+        self.uuid_class = "a"+str(self.uuid)
+
+    def _build(self):
+        """
+        Parses, transforms, serializes and validates the input document.
+        
+        This is skipped at construction when the render cache holds this 
+        display, and happens on first access of xml, text or formatter.
+        """
+        if self._path is not None:
+            with open(self._path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    self._xml, self._limit_hit = self._parse(
+                        buf, self.limits, self._chunk_size)
+        else:
+            self._xml, self._limit_hit = self._parse(
+                self._in_obj, self.limits, self._chunk_size)
+        self._in_obj = None
+        if self._transform is not None and self._xml is not None:
+            result = compile_xslt(self._transform)(self._xml)
+            if result.getroot() is None:
+                raise ValueError(f"{self._transform} did not produce an XML "
+                                 "tree.")
+            self._xml = result.getroot()
+        # validate the document itself, before it is folded or clipped, and
+        # keep invalid elements (and their ancestors) out of folded runs
+        invalid = []
+        if self._schema is not None and self._xml is not None:
+            invalid = _invalid_elements(self._xml, self._schema)
+        keep = set()
+        for el, _ in invalid:
+            while el is not None and el not in keep:
+                keep.add(el)
+                el = el.getparent()
+        copies = {}
+        fold_min = self.fold_min if self.fold else None
+        if self._xml is None:
+            # the limit was hit before the root element, only say which
+            display_tree = et.Comment(
+                f" display truncated: {self._limit_hit} before the root "
+                "element ")
+            copies = None
+        elif self._limit_hit is not None:
+            # the part parsed can be far more than can be shown in time: the
+            # copy gets the timeout again, and is capped by default
+            max_elements = self.limits.get('max_elements')
+            if max_elements is None:
+                max_elements = TRUNCATED_MAX_ELEMENTS
+            deadline = None
+            if self.limits.get('timeout') is not None:
+                deadline = time.monotonic() + self.limits['timeout']
+            display_tree = _display_copy(
+                self._xml, fold_min=fold_min,
+                max_text_len=self.max_text_len, 
+                max_attr_len=self.max_attr_len,
+                max_depth=self.limits.get('max_depth'),
+                max_elements=max_elements, keep=keep, copies=copies,
+                deadline=deadline
+                )
+            display_tree.insert(0, et.Comment(
+                f" display truncated: {self._limit_hit} "))
+        elif (self.fold or self.max_text_len is not None 
+                or self.max_attr_len is not None):
+            display_tree = _display_copy(self._xml, fold_min=fold_min,
+                                         max_text_len=self.max_text_len, 
+                                         max_attr_len=self.max_attr_len,
+                                         keep=keep, copies=copies)
+        else:
+            display_tree = self._xml
+            copies = None
+        # serializing straight to str means pygments never has to guess and
+        # decode the encoding of the text it lexes
+        self._text = et.tostring(display_tree, pretty_print=True,
+                                 encoding='unicode')
+        self._errors = self._error_lines(invalid, display_tree, copies)
+        if self._errors:
+            annotations = {}
+            for line, message in self._errors:
+                annotations.setdefault(line, []).append(message)
+            self._formatter = AnnotatedHtmlFormatter(
+                style=self.style,
+                annotations={k: "\n".join(v) for k, v in annotations.items()}
+                )
+        else:
+            self._formatter = get_formatter(self.style)
+        self._built = True
+
+    def _error_lines(self, invalid, display_tree, copies):
+        """
+        Maps (element, message) validation errors to (line, message) in the
+        displayed text.
+        
+        Errors on elements left out of the display (e.g., beyond a limit) go
+        to their closest displayed ancestor, those without an element to the
+        first line.
+        """
+        if not invalid:
+            return []
+        # only needed when there are errors: the reparsed text has the same 
+        # nodes in the same order, and knows the line each starts on
+        positions = {node: i for i, node in enumerate(display_tree.iter())}
+        reparsed = list(et.fromstring(self._text).iter())
+        errors = []
+        for el, message in invalid:
+            while el is not None and copies is not None and el not in copies:
+                el = el.getparent()
+            if el is None:
+                line = 1
+            else:
+                shown = el if copies is None else copies[el]
+                line = reparsed[positions[shown]].sourceline
+            errors.append((line, message))
+        return errors
+
+    def _cache_options(self):
+        """
+        Render options that key the on-disk cache, or None if the display 
+        can't be cached (e.g., with an already compiled stylesheet).
+        """
+        sources = []
+        for source in (self._transform, self._schema):
+            if source is None:
+                sources.append(None)
+            elif isinstance(source, (et.XSLT, et.XMLSchema, et.RelaxNG)):
+                return None
+            else:
+                key = _source_key(source)
+                sources.append(key.hex() if isinstance(key, bytes) 
+                               else list(key))
+        return {"style": self.style, 
+                "fold_min": self.fold_min if self.fold else None,
+                "max_text_len": self.max_text_len,
+                "max_attr_len": self.max_attr_len,
+                "limits": self.limits,
+                "transform": sources[0],
+                "schema": sources[1]}
+
+    def _store(self, **fields):
+        """
+        Adds fields (html or tokens) to this display's on-disk cache entry.
+        
+        Displays cut short by a limit are not cached, as a timeout can cut
+        the same document short at different points.
+        """
+        render_cache = cache.get_cache()
+        if (render_cache is None or self._cache_key is None 
+                or self.limit_hit is not None):
+            return
+        render_cache.put(self._cache_key, self.digest, self.errors, **fields)
+
+    @property
+    def xml(self):
+        """
+        The parsed (and transformed) lxml.etree._Element being displayed, or
+        None if a limit was exceeded before the root element.
+        """
+        if not self._built:
+            self._build()
+        return self._xml
+
+    @property
+    def text(self):
+        """
+        The pretty-printed document text that is highlighted.
+        """
+        if not self._built:
+            self._build()
+        return self._text
+
+    @property
+    def formatter(self):
+        if not self._built:
+            self._build()
+        return self._formatter
+
+    @property
+    def errors(self):
+        """
+        Schema validation errors, as a list of (line, message).
+        """
+        if self._cached is not None:
+            return self._cached["errors"]
+        return self._errors
+
+    @property
+    def limit_hit(self):
+        """
+        The LimitExceeded that cut the display short, or None.
+        """
+        if not self._built:
+            # only displays within their limits are cached
+            return None
+        return self._limit_hit
+    
+    @classmethod
+    def _parse(cls, in_obj, limits, chunk_size=CHUNK_SIZE):
+        """
+        Converts in_obj to an element within limits.
+        
+        Returns (element, limit_hit), with limit_hit the LimitExceeded for the
+        first limit exceeded, or None.
+        """
+        guarded = any(limits.get(name) is not None for name in LIMIT_NAMES)
+        if isinstance(in_obj, (str, bytes)) and guarded:
+            return _parse_buffer(in_obj, chunk_size, limits)
+        elif isinstance(in_obj, mmap.mmap):
+            return _parse_buffer(in_obj, chunk_size, limits)
+        root = cls._to_element(in_obj)
+        return root, _check_element(root, limits) if guarded else None
+
+    @staticmethod
+    def _to_element(in_obj):
+        """
+        Converts any of the accepted input types into an lxml.etree._Element.
+        """
+        if isinstance(in_obj, mmap.mmap):
+            return _parse_buffer(in_obj)[0]
+        elif isinstance(in_obj, str) and in_obj.lstrip().startswith('<?xml'):
+            return et.fromstring(in_obj.encode('utf-8'), parser=utf8_parser)
+        elif isinstance(in_obj, (str, bytes)):
+            return et.fromstring(in_obj, parser=no_blank_parser)
         elif isinstance(in_obj, et._ElementTree):
-            self.xml = in_obj.getroot()
+            return in_obj.getroot()
         elif isinstance(in_obj, et._Element):
-            self.xml = in_obj
+            return in_obj
         else:
             raise TypeError(f"{in_obj} is of type {type(in_obj)}."
                             "This object only can displays objects of type "
-                            "str, bytes, lxml.etree._ElementTree, or "
-                            "lxml.etree._Element.")
+                            "str, bytes, mmap.mmap, lxml.etree._ElementTree, "
+                            "or lxml.etree._Element.")
+
+    @classmethod
+    def from_file(cls, path, chunk_size=CHUNK_SIZE, **kwargs):
+        """
+        Displays a local XML file by memory-mapping it rather than reading it.
         
-        self.text = et.tostring(self.xml, pretty_print=True)
-        self.style = style
-        self.formatter = HtmlFormatter(style=self.style)
-        self.uuid_class = "a"+str(self.uuid)
-        self.template = template
-        self.extras = extras
-    
+        The mapped file is fed to lxml ``chunk_size`` bytes at a time, so the 
+        file's contents are never materialized as one intermediate bytes 
+        object, and pages already parsed are released back to the OS. This
+        saves about the file's size in peak memory; the lxml tree and the 
+        pretty-printed text still dominate. For a 19.8 MiB file of 500,000 
+        rows (see benchmarks/from_file_memory.py):
+        
+        ===============================  ===============  ===========
+        path                             peak RSS growth  peak traced
+        ===============================  ===============  ===========
+        XML(open(path, 'rb').read())     392.9 MiB        95.0 MiB
+        XML.from_file(path)              373.8 MiB        75.2 MiB
+        ===============================  ===============  ===========
+        
+        Parameters
+        ----------
+        
+        path: str or os.PathLike
+            Path to the XML file to be displayed
+        chunk_size: int, optional
+            Number of bytes passed to the parser at a time
+        **kwargs:
+            Passed on to XML
+        """
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # an empty file can't be mapped; parse it to get lxml's error
+                return cls(b'', chunk_size=chunk_size, **kwargs)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                disp = cls(buf, chunk_size=chunk_size, **kwargs)
+        if not disp._built:
+            # found in the render cache; the map is closed, so a later build
+            # has to map the file again
+            disp._in_obj, disp._path = None, path
+        return disp
+
+    def expand(self):
+        """
+        Returns an unfolded version of a folded XML display, with the same 
+        options otherwise (the transform is already applied to xml).
+        """
+        if self.xml is None:
+            return self
+        return type(self)(self.xml, style=self.style, template=self.template,
+                          extras=self.extras, schema=self._schema,
+                          output=self.output, max_text_len=self.max_text_len,
+                          max_attr_len=self.max_attr_len, limits=self.limits,
+                          chunk_size=self._chunk_size)
+
+    @staticmethod
+    def diff(a, b, style='default'):
+        """
+        Displays the differences between two documents side by side.
+        
+        Unchanged subtrees are matched by content hash and collapsed, and only
+        changed elements are shown in full and highlighted.
+        
+        Parameters
+        ----------
+        
+        a, b: str, lxml.etree._Element, lxml.etree._ElementTree, or bytes
+            The old and new documents
+        style: str, optional
+            Pygment style names (the default is 'default')
+        """
+        from .diff import XMLDiff
+        return XMLDiff(a, b, style=style)
+
+    @classmethod
+    def validate_all(cls, in_objs, schema, executor=None):
+        """
+        Validates many documents against one schema.
+        
+        Parameters
+        ----------
+        
+        in_objs: iterable
+            Objects accepted by XML; use str or bytes with a process pool
+        schema: str, lxml.etree._ElementTree, XMLSchema, or RelaxNG
+            Schema (or path to one); use a path with a process pool
+        executor: concurrent.futures.Executor, optional
+            Pool to validate in; validates serially if not given
+        
+        Returns
+        -------
+        
+        list of lists of (line, message) tuples, one per document
+        """
+        if executor is None:
+            return [validation_errors(obj, schema) for obj in in_objs]
+        return list(executor.map(validation_errors, in_objs, repeat(schema)))
+
     @classmethod
-    def display_all_styles(cls, in_obj):
+    def display_all_styles(cls, in_obj, transform=None):
         """
         Displays all available pygments styles using XML.style_gen()
         
@@ -69,22 +901,25 @@ class XML:
         
         in_obj: str lxml.etree._Element, lxml.ettree._ElementTree, or bytes
             Object to be displayed as html
+        transform: str, lxml.etree._ElementTree, or lxml.etree.XSLT, optional
+            XSLT stylesheet (or path to one) applied before display
         """
-        for disp in cls.style_gen(in_obj):
+        for disp in cls.style_gen(in_obj, transform=transform):
             display(disp)
                         
     @classmethod
-    def style_gen(cls, in_obj):
+    def style_gen(cls, in_obj, transform=None):
         """
         Generator for iterating over all of the styles available from pygments.
         
         If you declare this xml = XML.style_gen(text), use next(xml).
         """
-        for style in get_all_styles():
+        for style in all_styles():
             yield(cls(in_obj, 
                       style=style, 
                       template=cls.NAMED_STYLE_TEMPLATE, 
-                      extras={"style_name": style}
+                      extras={"style_name": style},
+                      transform=transform
                       ))
     
     @property
@@ -96,18 +931,150 @@ class XML:
         
         TODO: figure out a way to add a toggleable arrow for collapsing this
         """
-        temp_css = self.formatter.get_style_defs()
+        temp_css = get_style_defs(self.style)
         css_list = [f"div.{self.uuid_class} {x}" for x in temp_css.split("\n")]
         return "\n".join(css_list)
 
+    @property
+    def digest(self):
+        """
+        sha256 hex digest of the displayed text, style and validation errors.
+        """
+        if self._cached is not None:
+            return self._cached["digest"]
+        if self._digest is None:
+            key = repr((self.style, self.errors)) + "\0" + self.text
+            self._digest = sha256(key.encode('utf-8')).hexdigest()
+        return self._digest
+
     @property
     def uuid(self):
-        return uuid4()
+        """
+        UUID derived from digest, so identical displays get identical classes.
+        """
+        return UUID(self.digest[:32])
 
-    def _repr_html_(self):
+    def to_json(self):
+        """
+        Returns the structured token representation sent with output='tokens'.
+        """
+        if self._cached is not None and self._cached["tokens"] is not None:
+            tokens = self._cached["tokens"]
+        else:
+            tokens = compact_tokens(self.text)
+            self._store(tokens=tokens)
+        return token_payload(tokens, self.style)
+
+    def viewer(self, **kwargs):
+        """
+        Returns an XMLViewer serving this display's lines over a comm.
+        
+        Keyword arguments are passed on to XMLViewer; without any, the viewer 
+        is created once and reused.
+        """
+        if kwargs:
+            return XMLViewer(self, **kwargs)
+        if self._viewer is None:
+            self._viewer = XMLViewer(self)
+        return self._viewer
+
+    def search(self, pattern=None, tag=None, attrib=None, context=2, flags=0,
+               word=False):
+        """
+        Displays only the elements matching a search, with context lines.
+        
+        An inverted index of the parsed document is built on first use and
+        reused by later searches on this object. It covers the whole 
+        document, including values that the display folds or clips, and the
+        matches are shown in its pretty-printed text rather than the display.
+        Criteria given together must all match.
+        
+        Parameters
+        ----------
+        
+        pattern: str, optional
+            Regular expression searched for in element text and tails
+        tag: str, optional
+            Tag of matching elements, with or without its {namespace}
+        attrib: str or dict, optional
+            Attribute name that matching elements have, or a dict mapping 
+            attribute names to regular expressions (or None) for their values
+        context: int, optional
+            Number of lines shown before and after each match (default 2)
+        flags: int, optional
+            re flags used for pattern and attribute values
+        word: bool, optional
+            If True, pattern is a single word (word characters only) found as
+            a whole word, ignoring case, by a lookup in the index instead of
+            a regular expression search; e.g., 'err' then matches "ERR 4" 
+            but not "error"
+        
+        Returns
+        -------
+        
+        SearchResult
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex(self._full_text())
+        lines = self._search_index.query(pattern, tag=tag, attrib=attrib,
+                                         flags=flags, word=word)
+        return SearchResult(self._search_index, lines, style=self.style,
+                            context=context)
+
+    def _full_text(self):
+        """
+        Pretty-printed text of the whole parsed document, which is the 
+        display text unless the display is folded, clipped or cut short by a
+        limit.
+        """
+        root = self.xml
+        if root is None:
+            return ""
+        if (self.fold or self.max_text_len is not None 
+                or self.max_attr_len is not None 
+                or self._limit_hit is not None):
+            return et.tostring(root, pretty_print=True, encoding='unicode')
+        return self.text
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        if self.output == 'tokens':
+            # a short note, not the html this output exists to avoid, for
+            # frontends without the renderer, e.g. nbconvert
+            note = renderer_note(self.text.count("\n"), self.style, 
+                                 self.output)
+            return {MIME_TYPE: self.to_json(), 'text/plain': note}
+        elif self.output == 'viewer':
+            return self.viewer()._repr_mimebundle_(include, exclude)
+
+    def _highlight(self):
+        """
+        Returns the highlighted html for this document, without the template.
+        """
+        if self._cached is not None and self._cached["html"] is not None:
+            return self._cached["html"]
         content = highlight(self.text, XmlLexer(), self.formatter)
+        self._store(html=content)
+        return content
+
+    def _repr_html_(self):
+        if self.output != 'html':
+            return None
+        if self.dedupe and shown(self.uuid_class, f"div.{self.uuid_class} "):
+            # the content is always sent, so the output doesn't depend on
+            # scripts running, e.g. in untrusted notebooks or nbconvert
+            return self._html(style_css="")
+        return self._html()
+
+    def _html(self, style_css=None):
+        """
+        Returns the full html output, template included, with style_css 
+        instead of this display's stylesheet if given.
+        """
+        content = self._highlight()
+        if style_css is None:
+            style_css = self.style_css
         return self.template.format(uuid_class=self.uuid_class,
-                                    style_css=self.style_css,
+                                    style_css=style_css,
                                     content=content,
                                     extras=self.extras
     )
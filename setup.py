@@ -11,6 +11,7 @@ setup_dict = dict(
     version=get_version('display_xml/_version.py'),
     description='Prettier XML in IPython/Jupyter display contexts.',
     packages=find_packages(),
+    package_data={'display_xml': ['static/*.js']},
     author          = 'M Pacer',
     author_email    = 'mpacer@berkeley.edu',
     url             = 'https://github.com/mpacer/display_xml',